@@ -7,7 +7,7 @@ directions go around the hole.
 
 from __future__ import division
 import math
-from scaffoldmaker.utils.interpolation import interpolateCubicHermite, interpolateCubicHermiteDerivative
+from scaffoldmaker.utils.interpolation import interpolateCubicHermiteList, interpolateCubicHermiteDerivativeList
 from opencmiss.zinc.element import Element, Elementbasis, Elementfieldtemplate
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.node import Node
@@ -262,6 +262,10 @@ class MeshType_2d_platehole1(object):
             if useCrossDerivatives:
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D2_DS1DS2, 1, zero)
             nodeIdentifier = nodeIdentifier + 1
+        # interpolate all points through wall, for each point around
+        wallXiList = [ (1.0 - (n2 + 1)/elementsCountThroughWall) for n2 in range(elementsCountThroughWall) ]
+        wall_x = interpolateCubicHermiteList(inner_x, inner_d2, outer_x, outer_d2, wallXiList)
+        wall_d2 = interpolateCubicHermiteDerivativeList(inner_x, inner_d2, outer_x, outer_d2, wallXiList)
         # inner nodes
         for n2 in range(elementsCountThroughWall):
             xir = (n2 + 1)/elementsCountThroughWall
@@ -269,12 +273,12 @@ class MeshType_2d_platehole1(object):
             for n1 in range(elementsCountAround):
                 node = nodes.createNode(nodeIdentifier, nodetemplate)
                 cache.setNode(node)
-                v = interpolateCubicHermite(inner_x[n1], inner_d2[n1], outer_x[n1], outer_d2[n1], xi)
+                v = wall_x[n1][n2]
                 x[0] = v[0]
                 x[1] = v[1]
                 dx_ds1[0] = xir*inner_d1[n1][0] + xi*outer_d1[n1][0]
                 dx_ds1[1] = xir*inner_d1[n1][1] + xi*outer_d1[n1][1]
-                d2 = interpolateCubicHermiteDerivative(inner_x[n1], inner_d2[n1], outer_x[n1], outer_d2[n1], xi)
+                d2 = wall_d2[n1][n2]
                 dx_ds2[0] = -d2[0]/elementsCountThroughWall
                 dx_ds2[1] = -d2[1]/elementsCountThroughWall
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x)
@@ -97,46 +97,39 @@ class MeshType_3d_box1(object):
         elementtemplate.setElementShapeType(Element.SHAPE_TYPE_CUBE)
         result = elementtemplate.defineField(coordinates, -1, eft)
 
-        cache = fm.createFieldcache()
-
         # create nodes
-        nodeIdentifier = 1
-        x = [ 0.0, 0.0, 0.0 ]
-        dx_ds1 = [ 1.0 / elementsCount1, 0.0, 0.0 ]
-        dx_ds2 = [ 0.0, 1.0 / elementsCount2, 0.0 ]
-        dx_ds3 = [ 0.0, 0.0, 1.0 / elementsCount3 ]
-        zero = [ 0.0, 0.0, 0.0 ]
+        nodeIdentifiers = []
+        nx = []
         for n3 in range(elementsCount3 + 1):
-            x[2] = n3 / elementsCount3
             for n2 in range(elementsCount2 + 1):
-                x[1] = n2 / elementsCount2
                 for n1 in range(elementsCount1 + 1):
-                    x[0] = n1 / elementsCount1
-                    node = nodes.createNode(nodeIdentifier, nodetemplate)
-                    cache.setNode(node)
-                    coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x)
-                    coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
-                    coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
-                    coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-                    if useCrossDerivatives:
-                        coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D2_DS1DS2, 1, zero)
-                        coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D2_DS1DS3, 1, zero)
-                        coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D2_DS2DS3, 1, zero)
-                        coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D3_DS1DS2DS3, 1, zero)
-                    nodeIdentifier = nodeIdentifier + 1
+                    nodeIdentifiers.append(len(nodeIdentifiers) + 1)
+                    nx.append([ n1 / elementsCount1, n2 / elementsCount2, n3 / elementsCount3 ])
+        nodesCount = len(nodeIdentifiers)
+        valueLabelParameters = {
+            Node.VALUE_LABEL_VALUE : nx,
+            Node.VALUE_LABEL_D_DS1 : [ [ 1.0 / elementsCount1, 0.0, 0.0 ] ]*nodesCount,
+            Node.VALUE_LABEL_D_DS2 : [ [ 0.0, 1.0 / elementsCount2, 0.0 ] ]*nodesCount,
+            Node.VALUE_LABEL_D_DS3 : [ [ 0.0, 0.0, 1.0 / elementsCount3 ] ]*nodesCount
+        }
+        if useCrossDerivatives:
+            zero = [ [ 0.0, 0.0, 0.0 ] ]*nodesCount
+            for valueLabel in [ Node.VALUE_LABEL_D2_DS1DS2, Node.VALUE_LABEL_D2_DS1DS3, Node.VALUE_LABEL_D2_DS2DS3, Node.VALUE_LABEL_D3_DS1DS2DS3 ]:
+                valueLabelParameters[valueLabel] = zero
+        createNodesWithParameters(coordinates, nodes, nodetemplate, nodeIdentifiers, valueLabelParameters)
 
         # create elements
-        elementIdentifier = 1
+        elementIdentifiers = []
+        elementsNodeIdentifiers = []
         no2 = (elementsCount1 + 1)
         no3 = (elementsCount2 + 1)*no2
         for e3 in range(elementsCount3):
             for e2 in range(elementsCount2):
                 for e1 in range(elementsCount1):
-                    element = mesh.createElement(elementIdentifier, elementtemplate)
+                    elementIdentifiers.append(len(elementIdentifiers) + 1)
                     bni = e3*no3 + e2*no2 + e1 + 1
-                    nodeIdentifiers = [ bni, bni + 1, bni + no2, bni + no2 + 1, bni + no3, bni + no3 + 1, bni + no2 + no3, bni + no2 + no3 + 1 ]
-                    result = element.setNodesByIdentifier(eft, nodeIdentifiers)
-                    elementIdentifier = elementIdentifier + 1
+                    elementsNodeIdentifiers.append([ bni, bni + 1, bni + no2, bni + no2 + 1, bni + no3, bni + no3 + 1, bni + no2 + no3, bni + no2 + no3 + 1 ])
+        createElementsWithNodes(mesh, elementtemplate, eft, elementIdentifiers, elementsNodeIdentifiers)
 
         fm.endChange()
 
@@ -9,6 +9,7 @@ from scaffoldmaker.utils.eft_utils import *
 from scaffoldmaker.utils.interpolation import *
 from scaffoldmaker.utils.zinc_utils import *
 from scaffoldmaker.utils.eftfactory_tricubichermite import eftfactory_tricubichermite
+from scaffoldmaker.utils.elementtemplatepool import ElementtemplatePool
 from opencmiss.zinc.element import Element, Elementbasis
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.node import Node
@@ -102,10 +103,13 @@ class MeshType_3d_heartatria1(object):
                     options[key] = 1.0E-6
 
     @staticmethod
-    def generateMesh(region, options):
+    def generateMesh(region, options, nodeIdentifierAllocator = None, elementIdentifierAllocator = None):
         """
-        :param region: Zinc region to define model in. Must be empty.
+        :param region: Zinc region to define model in. Must be empty unless allocators are supplied.
         :param options: Dict containing options. See getDefaultOptions().
+        :param nodeIdentifierAllocator, elementIdentifierAllocator: Optional IdentifierAllocator
+        for nodes and elements, passed when adding atria to an existing heart mesh so numbering
+        continues without rescanning the region. If None, they are created for the region.
         :return: None
         """
         elementsCountUp = options['Number of elements up']
@@ -160,7 +164,8 @@ class MeshType_3d_heartatria1(object):
         # Create nodes
         ##############
 
-        nodeIdentifier = 1
+        if nodeIdentifierAllocator is None:
+            nodeIdentifierAllocator = IdentifierAllocator(nodes)
 
         outerMajorMag = innerMajorMag + freeWallThickness
         outerMinorMag = innerMinorMag + freeWallThickness
@@ -290,6 +295,7 @@ class MeshType_3d_heartatria1(object):
                             outerZ ]
                         if (n3 == 1) and (n2 <= elementsCountUpSeptum) and (n1 == 0):
                             continue  # right septum node created in next loop
+                        nodeIdentifier = nodeIdentifierAllocator.allocate()
                         node = nodes.createNode(nodeIdentifier, nodetemplate)
                         layerNodeId[n1] = nodeIdentifier
                         cache.setNode(node)
@@ -316,7 +322,6 @@ class MeshType_3d_heartatria1(object):
                         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
                         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
                         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-                        nodeIdentifier += 1
 
             # apexes
             for i in range(2):
@@ -358,6 +363,7 @@ class MeshType_3d_heartatria1(object):
                         baseToEquatorRatio*deltaUpRadians[n3][-1]*outerMinorY,
                         0.0 ]
                 dx_ds3 = [ 0.0, 0.0, freeWallThickness ]
+                nodeIdentifier = nodeIdentifierAllocator.allocate()
                 node = nodes.createNode(nodeIdentifier, nodetemplate)
                 apexNodeId[n3] = nodeIdentifier
                 cache.setNode(node)
@@ -365,7 +371,6 @@ class MeshType_3d_heartatria1(object):
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-                nodeIdentifier += 1
 
         # transfer inner septum nodes to outer on opposite side, set derivative 3 to be node difference
         for n2 in range(elementsCountUpSeptum + 1):
@@ -414,6 +419,7 @@ class MeshType_3d_heartatria1(object):
         dx_ds1 = [ mag, 0.0, 0.0 ]
         dx_ds2 = [ 0.5*d for d in dc ]
         dx_ds3 = [ 0.0, 0.0, vc[2] + innerScaleZ*math.cos(math.pi - totalArcUpRadians + septumArcUpRadians) ]
+        nodeIdentifier = nodeIdentifierAllocator.allocate()
         node = nodes.createNode(nodeIdentifier, nodetemplate)
         septumNodeId = nodeIdentifier
         cache.setNode(node)
@@ -422,37 +428,37 @@ class MeshType_3d_heartatria1(object):
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-        nodeIdentifier += 1
 
         if False:
             # show centre/axes of atria
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ laCentreX, laCentreY, innerScaleZ*math.cos(totalArcUpRadians) ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ laInnerMajorX, laInnerMajorY, 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ laInnerMinorX, laInnerMinorY, 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, lengthRatio - freeWallThickness ])
-            nodeIdentifier += 1
 
             # show axes of right atrium
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ raCentreX, raCentreY, innerScaleZ*math.cos(totalArcUpRadians) ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ raInnerMajorX, raInnerMajorY, 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ raInnerMinorX, raInnerMinorY, 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, lengthRatio - freeWallThickness ])
-            nodeIdentifier += 1
 
         #################
         # Create elements
         #################
 
-        elementIdentifier = 1
-
         mesh = fm.findMeshByDimension(3)
+        if elementIdentifierAllocator is None:
+            elementIdentifierAllocator = IdentifierAllocator(mesh)
 
         tricubichermite = eftfactory_tricubichermite(mesh, useCrossDerivatives)
         tricubicHermiteBasis = fm.createElementbasis(3, Elementbasis.FUNCTION_TYPE_CUBIC_HERMITE)
+        elementtemplatePool = ElementtemplatePool(mesh, coordinates)
 
         eft = tricubichermite.createEftBasic()
         elementtemplate = mesh.createElementtemplate()
@@ -506,6 +512,7 @@ class MeshType_3d_heartatria1(object):
                         eft1 = eft
                         elementtemplate1 = elementtemplate
 
+                    elementIdentifier = elementIdentifierAllocator.allocate()
                     element = mesh.createElement(elementIdentifier, elementtemplate1)
                     result2 = element.setNodesByIdentifier(eft1, nids)
                     if eft1.getNumberOfLocalScaleFactors() == 1:
@@ -513,7 +520,6 @@ class MeshType_3d_heartatria1(object):
                     else:
                         result3 = 1
                     #print('create element', 'la' if i == 0 else 'ra', element.isValid(), elementIdentifier, result2, result3, nids)
-                    elementIdentifier += 1
 
         # septum transition interior collapsed elements
 
@@ -526,53 +532,59 @@ class MeshType_3d_heartatria1(object):
         ]
 
         for e in range(len(nids)):
-            eft1 = tricubichermite.createEftNoCrossDerivatives()
-            setEftScaleFactorIds(eft1, [1], [])
+            modifications = [ (setEftScaleFactorIds, ([1], [])) ]
             if e in [ 0, 2 ]:
-                remapEftNodeValueLabel(eft1, [ 1, 2, 3, 4, 6, 8 ], Node.VALUE_LABEL_D_DS2, [ ] )
-                remapEftNodeValueLabel(eft1, [ 1 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                remapEftNodeValueLabel(eft1, [ 3 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                remapEftNodeValueLabel(eft1, [ 3 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])
-                remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS3, []) ])
+                modifications += [
+                    (remapEftNodeValueLabel, ([ 1, 2, 3, 4, 6, 8 ], Node.VALUE_LABEL_D_DS2, [ ] )),
+                    (remapEftNodeValueLabel, ([ 1 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                    (remapEftNodeValueLabel, ([ 3 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                    (remapEftNodeValueLabel, ([ 3 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                    (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])),
+                    (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS3, []) ])) ]
                 if e == 0:
-                    #remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]) ])
-                    remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS2, [1]) ])
-                    #remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, []) ])
-                    remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])
-                    remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
+                    modifications += [
+                        #(remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]) ])),
+                        (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS2, [1]) ])),
+                        #(remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, []) ])),
+                        (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])),
+                        (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])) ]
                 else:
-                    remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])
-                    #remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, [1]) ])
-                    remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS2, []) ])
-                    remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1]), (Node.VALUE_LABEL_D_DS3, []) ])
-                remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])
+                    modifications += [
+                        (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])),
+                        #(remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, [1]) ])),
+                        (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS2, []) ])),
+                        (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1]), (Node.VALUE_LABEL_D_DS3, []) ])) ]
                 ln_map = [ 1, 2, 1, 2, 3, 4, 5, 4 ]
-                remapEftLocalNodes(eft1, 5, ln_map)
+                modifications += [
+                    (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])),
+                    (remapEftLocalNodes, (5, ln_map)) ]
             else:
-                remapEftNodeValueLabel(eft1, [ 1, 2, 3, 4, 5, 7 ], Node.VALUE_LABEL_D_DS2, [ ] )
-                remapEftNodeValueLabel(eft1, [ 4 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS3, [1]) ])
-                remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS3, [1]) ])
-                remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS3, [1]) ])
-                remapEftNodeValueLabel(eft1, [ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])
+                modifications += [
+                    (remapEftNodeValueLabel, ([ 1, 2, 3, 4, 5, 7 ], Node.VALUE_LABEL_D_DS2, [ ] )),
+                    (remapEftNodeValueLabel, ([ 4 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                    (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS3, [1]) ])),
+                    (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS3, [1]) ])),
+                    (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                    (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS3, [1]) ])),
+                    (remapEftNodeValueLabel, ([ 7 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])) ]
                 if e == 1:
-                    #remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]) ])
-                    remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS2, []) ])
-                    remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, [1]), (Node.VALUE_LABEL_D_DS3, []) ])
-                    remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
+                    modifications += [
+                        #(remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]) ])),
+                        (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1]), (Node.VALUE_LABEL_D_DS2, []) ])),
+                        (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, [1]), (Node.VALUE_LABEL_D_DS3, []) ])),
+                        (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])) ]
                 else:
-                    remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])
-                    remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                    remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1]), (Node.VALUE_LABEL_D_DS3, []) ])
+                    modifications += [
+                        (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])),
+                        (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                        (remapEftNodeValueLabel, ([ 8 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1]), (Node.VALUE_LABEL_D_DS3, []) ])) ]
                 ln_map = [ 1, 2, 1, 2, 3, 4, 3, 5 ]
-                remapEftLocalNodes(eft1, 5, ln_map)
+                modifications.append( (remapEftLocalNodes, (5, ln_map)) )
 
-            elementtemplate1 = mesh.createElementtemplate()
-            elementtemplate1.setElementShapeType(Element.SHAPE_TYPE_CUBE)
-            result = elementtemplate1.defineField(coordinates, -1, eft1)
+            eft1 = tricubichermite.getEftFromRecipe(tricubichermite.createEftNoCrossDerivatives, (), modifications)
+            elementtemplate1 = elementtemplatePool.getElementtemplate(eft1)
 
+            elementIdentifier = elementIdentifierAllocator.allocate()
             element = mesh.createElement(elementIdentifier, elementtemplate1)
             result2 = element.setNodesByIdentifier(eft1, nids[e])
             if eft1.getNumberOfLocalScaleFactors() == 1:
@@ -580,7 +592,6 @@ class MeshType_3d_heartatria1(object):
             else:
                 result3 = 1
             #print('create element st', elementIdentifier, result, result2, result3, nids[e])
-            elementIdentifier += 1
 
         # semi-regular rows above septum but below apex, including second septum transition elements
 
@@ -601,29 +612,31 @@ class MeshType_3d_heartatria1(object):
                              nodeId[1][e2][e1], nodeId[1][e2][en], nodeId[1][e2 + 1][e1], nodeId[1][e2 + 1][en] ]
 
                     if (e2 == elementsCountUpSeptum) and ((e1 == 0) or (e1 == elementsCountAround - 1)):
-                        eft1 = tricubichermite.createEftNoCrossDerivatives()
-                        setEftScaleFactorIds(eft1, [1], [])
                         if e1 == 0:
                             nids[4] = septumNodeId
-                            remapEftNodeValueLabel(eft1, [ 1 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                            remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]) ])
-                            remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]) ])
-                            remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS3, [0]) ])
-                            remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])
+                            modifications = [
+                                (setEftScaleFactorIds, ([1], [])),
+                                (remapEftNodeValueLabel, ([ 1 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                                (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]) ])),
+                                (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]) ])),
+                                (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS3, [0]) ])),
+                                (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, [1]) ])) ]
                         else:
                             nids[5] = septumNodeId
-                            remapEftNodeValueLabel(eft1, [ 2 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])
-                            remapEftNodeValueLabel(eft1, [ 5 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])
-                            remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS2, [0 if (i == 0) else 1]) ])
-                            remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]) ])
-                            remapEftNodeValueLabel(eft1, [ 6 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS3, [0]) ])
-                        elementtemplate1 = mesh.createElementtemplate()
-                        elementtemplate1.setElementShapeType(Element.SHAPE_TYPE_CUBE)
-                        result = elementtemplate1.defineField(coordinates, -1, eft1)
+                            modifications = [
+                                (setEftScaleFactorIds, ([1], [])),
+                                (remapEftNodeValueLabel, ([ 2 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, []), (Node.VALUE_LABEL_D_DS3, []) ])),
+                                (remapEftNodeValueLabel, ([ 5 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, []), (Node.VALUE_LABEL_D_DS2, []) ])),
+                                (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS1, [ (Node.VALUE_LABEL_D_DS1, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS2, [0 if (i == 0) else 1]) ])),
+                                (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS2, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]) ])),
+                                (remapEftNodeValueLabel, ([ 6 ], Node.VALUE_LABEL_D_DS3, [ (Node.VALUE_LABEL_D_DS2, [1 if (i == 0) else 0]), (Node.VALUE_LABEL_D_DS3, [0]) ])) ]
+                        eft1 = tricubichermite.getEftFromRecipe(tricubichermite.createEftNoCrossDerivatives, (), modifications)
+                        elementtemplate1 = elementtemplatePool.getElementtemplate(eft1)
                     else:
                         eft1 = eft
                         elementtemplate1 = elementtemplate
 
+                    elementIdentifier = elementIdentifierAllocator.allocate()
                     element = mesh.createElement(elementIdentifier, elementtemplate1)
                     result2 = element.setNodesByIdentifier(eft1, nids)
                     if eft1.getNumberOfLocalScaleFactors() == 1:
@@ -647,7 +660,6 @@ class MeshType_3d_heartatria1(object):
                             elif e1 == (elementsCountAround - 2):
                                 svcElementId = elementIdentifier
 
-                    elementIdentifier += 1
 
         for i in range(2):
             nodeId = laNodeId if (i == 0) else raNodeId
@@ -657,13 +669,12 @@ class MeshType_3d_heartatria1(object):
 
             # create top apex elements
             # scale factor identifiers follow convention of offsetting by 100 for each 'version'
-            elementtemplate1 = mesh.createElementtemplate()
-            elementtemplate1.setElementShapeType(Element.SHAPE_TYPE_CUBE)
             for e1 in range(elementsCountAround):
                 va = e1
                 vb = (e1 + 1)%elementsCountAround
-                eft1 = tricubichermite.createEftShellApexTop(va*100, vb*100)
-                elementtemplate1.defineField(coordinates, -1, eft1)
+                eft1 = tricubichermite.getEftFromRecipe(tricubichermite.createEftShellApexTop, (va*100, vb*100))
+                elementtemplate1 = elementtemplatePool.getElementtemplate(eft1)
+                elementIdentifier = elementIdentifierAllocator.allocate()
                 element = mesh.createElement(elementIdentifier, elementtemplate1)
                 n2 = elementsCountUp - 1
                 nodeIdentifiers = [ nodeId[0][n2][va], nodeId[0][n2][vb], apexNodeId[0], nodeId[1][n2][va], nodeId[1][n2][vb], apexNodeId[1] ]
@@ -677,16 +688,13 @@ class MeshType_3d_heartatria1(object):
                     -math.cos(aRadians[vb]), -math.sin(aRadians[vb]), deltaRadians[vb]
                 ]
                 result = element.setScaleFactors(eft1, scalefactors)
-                elementIdentifier = elementIdentifier + 1
 
         # add right atria inlets (venae cavae)
 
         for elementId in [ ivcElementId, svcElementId ]:
             element = mesh.findElementByIdentifier(elementId)
             vcLength = vcInnerDiameter*0.5
-            tricubichermite.replaceElementWithInlet4(element, elementIdentifier, nodetemplate, nodeIdentifier, vcLength, vcInnerDiameter, vcWallThickness)
-            elementIdentifier += 4
-            nodeIdentifier += 8
+            tricubichermite.replaceElementWithInlet4(element, elementIdentifierAllocator.allocate(4), nodetemplate, nodeIdentifierAllocator.allocate(8), vcLength, vcInnerDiameter, vcWallThickness)
             mesh.destroyElement(element)
 
         # add left atria inlets (pulmonary veins)
@@ -694,9 +702,7 @@ class MeshType_3d_heartatria1(object):
         for elementId in [ lapvElementId, lppvElementId, rapvElementId, rppvElementId ]:
             element = mesh.findElementByIdentifier(elementId)
             pvLength = pvInnerDiameter*0.5
-            tricubichermite.replaceElementWithInlet4(element, elementIdentifier, nodetemplate, nodeIdentifier, pvLength, pvInnerDiameter, pvWallThickness)
-            elementIdentifier += 4
-            nodeIdentifier += 8
+            tricubichermite.replaceElementWithInlet4(element, elementIdentifierAllocator.allocate(4), nodetemplate, nodeIdentifierAllocator.allocate(8), pvLength, pvInnerDiameter, pvWallThickness)
             mesh.destroyElement(element)
 
         fm.endChange()
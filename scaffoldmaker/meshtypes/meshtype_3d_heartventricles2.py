@@ -114,11 +114,16 @@ class MeshType_3d_heartventricles2(object):
             options['RV arc around degrees'] = 270.0
 
     @staticmethod
-    def generateBaseMesh(region, options):
+    def generateBaseMesh(region, options, nodeIdentifierAllocator = None, elementIdentifierAllocator = None):
         """
         Generate the base tricubic Hermite mesh. See also generateMesh().
-        :param region: Zinc region to define model in. Must be empty.
+        :param region: Zinc region to define model in. Must be empty unless allocators are supplied.
         :param options: Dict containing options. See getDefaultOptions().
+        :param nodeIdentifierAllocator: Optional IdentifierAllocator to number nodes from, passed
+        by generators adding to this mesh so they continue numbering without rescanning the region.
+        If None, one is created for the region's nodes.
+        :param elementIdentifierAllocator: Optional IdentifierAllocator to number elements from.
+        If None, one is created for the region's mesh.
         :return: list of AnnotationGroup
         """
         elementsCountAroundLVFreeWall = options['Number of elements around LV free wall']
@@ -165,7 +170,9 @@ class MeshType_3d_heartventricles2(object):
         nodetemplate.setValueNumberOfVersions(coordinates, -1, Node.VALUE_LABEL_D_DS3, 1)
         nodetemplateApex = nodetemplate
 
-        nodeIdentifier = 1
+        if nodeIdentifierAllocator is None:
+            nodeIdentifierAllocator = IdentifierAllocator(nodes)
+        firstNodeIdentifier = nodeIdentifierAllocator.getNextIdentifier()
 
         # LV nodes
 
@@ -207,29 +214,28 @@ class MeshType_3d_heartventricles2(object):
             #print('length total apex septum', lengthUp, lengthUpApex, lengthUpSeptum, ' size apex septum', elementSizeUpApex, elementSizeUpSeptum)
 
             # apex node, noting s1, s2 is x, -y to get out outward s3
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ 0.0, 0.0, -a ])
             coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ elementSizeUpApex, 0.0, 0.0 ])
             coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ 0.0, -elementSizeUpApex, 0.0, 0.0 ])
             coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, -lvApexThickness ])
-            nodeIdentifier = nodeIdentifier + 1
 
-            radiansUp = 0.0
+            arcLengthsUp = []
             for n2 in range(elementsCountUpLV):
-
                 if n2 < elementsCountUpApex:
-                    arcLengthUp = elementSizeUpApex
-                    dArcLengthUp = elementSizeUpApex
+                    arcLengthsUp.append(elementSizeUpApex)
+                elif n2 == elementsCountUpApex:
+                    arcLengthsUp.append(elementSizeUpSeptumTransition)
                 else:
-                    if n2 == elementsCountUpApex:
-                        arcLengthUp = elementSizeUpSeptumTransition
-                    else:
-                        arcLengthUp = elementSizeUpSeptum
-                    dArcLengthUp = elementSizeUpSeptum
-                radiansUp = updateEllipseAngleByArcLength(a, b, radiansUp, arcLengthUp)
-                if n2 == (elementsCountUpLV - 1):
-                    radiansUp = 0.5*math.pi
+                    arcLengthsUp.append(elementSizeUpSeptum)
+            radiansUpList = getEllipsePointsAtArcLengths(a, b, 0.0, arcLengthsUp)[0]
+            radiansUpList[-1] = 0.5*math.pi
+            for n2 in range(elementsCountUpLV):
+
+                dArcLengthUp = elementSizeUpApex if (n2 < elementsCountUpApex) else elementSizeUpSeptum
+                radiansUp = radiansUpList[n2 + 1]
                 #print(n3, n2, ' -> ', math.degrees(radiansUp), 'dArcLengthUp', dArcLengthUp)
                 cosRadiansUp = math.cos(radiansUp)
                 sinRadiansUp = math.sin(radiansUp)
@@ -322,6 +328,7 @@ class MeshType_3d_heartventricles2(object):
                     if (n3 == 1) and (n2 == (elementsCountUpApex - 1)) and (n1 >= 0) and (n1 <= elementsCountAroundSeptum):
                         dx_ds2 = [ d*d2FactorRvTransition for d in dx_ds2 ]
 
+                    nodeIdentifier = nodeIdentifierAllocator.allocate()
                     node = nodes.createNode(nodeIdentifier, nodetemplate)
                     cache.setNode(node)
                     coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x)
@@ -336,11 +343,10 @@ class MeshType_3d_heartventricles2(object):
                         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
                         cache.setNode(node)
                         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-                    nodeIdentifier = nodeIdentifier + 1
 
         # RV nodes
 
-        nidr = nodeIdentifier
+        nidr = nodeIdentifierAllocator.getNextIdentifier()
 
         rxOuter = []
         rd1Outer = []
@@ -411,11 +417,7 @@ class MeshType_3d_heartventricles2(object):
             #    for n in range(len(rd2)):
             #        rd2[n] = [ d*elementSizeUpRvTransition1/elementSizeUpRv for d in rd2[n] ]
 
-            rd3 = []
-            for n in range(len(rx)):
-                normal = vector.crossproduct3(rd1[n], rd2[n])
-                mag = rvFreeWallThickness/vector.magnitude(normal)
-                rd3.append([ c*mag for c in normal ])
+            rd3 = vector.normaliseList(vector.crossproduct3List(rd1, rd2), rvFreeWallThickness)
 
             rxOuter.append(rx)
             rd1Outer.append(rd1)
@@ -425,7 +427,7 @@ class MeshType_3d_heartventricles2(object):
 
         # get inner RV nodes from outer
 
-        nidl = 2 + (elementsCountUpApex - 1)*norl
+        nidl = firstNodeIdentifier + 1 + (elementsCountUpApex - 1)*norl
 
         rxInner = []
         rd1Inner = []
@@ -594,6 +596,7 @@ class MeshType_3d_heartventricles2(object):
                     rd2 = rd2Outer[n2]
                     rd3 = rd3Outer[n2]
                 for n1 in range(elementsCountAroundRV - 1):
+                    nodeIdentifier = nodeIdentifierAllocator.allocate()
                     node = nodes.createNode(nodeIdentifier, nodetemplate)
                     cache.setNode(node)
                     coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, rx[n1])
@@ -601,7 +604,6 @@ class MeshType_3d_heartventricles2(object):
                     coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, rd2[n1])
                     coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, rd3[n1])
                     nid = nodeIdentifier
-                    nodeIdentifier += 1
                     nids.append(nid)
 
 
@@ -619,7 +621,8 @@ class MeshType_3d_heartventricles2(object):
         tricubicHermiteBasis = fm.createElementbasis(3, Elementbasis.FUNCTION_TYPE_CUBIC_HERMITE)
         eft = tricubichermite.createEftNoCrossDerivatives()
 
-        elementIdentifier = 1
+        if elementIdentifierAllocator is None:
+            elementIdentifierAllocator = IdentifierAllocator(mesh)
 
         elementtemplate1 = mesh.createElementtemplate()
         elementtemplate1.setElementShapeType(Element.SHAPE_TYPE_CUBE)
@@ -740,6 +743,7 @@ class MeshType_3d_heartventricles2(object):
 
                 result = elementtemplate1.defineField(coordinates, -1, eft1)
 
+                elementIdentifier = elementIdentifierAllocator.allocate()
                 element = mesh.createElement(elementIdentifier, elementtemplate1)
                 result2 = element.setNodesByIdentifier(eft1, nids)
                 if eft1.getNumberOfLocalScaleFactors() > 0:
@@ -747,14 +751,13 @@ class MeshType_3d_heartventricles2(object):
                 else:
                     result3 = 7
                 #print('create element lv', elementIdentifier, result, result2, result3, nids)
-                elementIdentifier = elementIdentifier + 1
 
                 for meshGroup in meshGroups:
                     meshGroup.addElement(element)
 
         # RV elements
 
-        nidl = 2 + (elementsCountUpApex - 1)*norl
+        nidl = firstNodeIdentifier + 1 + (elementsCountUpApex - 1)*norl
 
         for e2 in range(elementsCountUpRV):
 
@@ -838,6 +841,7 @@ class MeshType_3d_heartventricles2(object):
 
                 result = elementtemplate1.defineField(coordinates, -1, eft1)
 
+                elementIdentifier = elementIdentifierAllocator.allocate()
                 element = mesh.createElement(elementIdentifier, elementtemplate1)
                 result2 = element.setNodesByIdentifier(eft1, nids)
                 if eft1.getNumberOfLocalScaleFactors() > 0:
@@ -845,7 +849,6 @@ class MeshType_3d_heartventricles2(object):
                 else:
                     result3 = 7
                 #print('create element rv', elementIdentifier, result, result2, result3, nids)
-                elementIdentifier = elementIdentifier + 1
 
                 for meshGroup in meshGroups:
                     meshGroup.addElement(element)
@@ -102,12 +102,15 @@ class MeshType_3d_heartventriclesbase2(object):
             options['Atria major axis rotation degrees'] = 75.0
 
     @staticmethod
-    def generateBaseMesh(region, options):
+    def generateBaseMesh(region, options, nodeIdentifierAllocator = None, elementIdentifierAllocator = None):
         """
         Generate the base tricubic Hermite mesh. See also generateMesh().
-        :param region: Zinc region to define model in. Must be empty.
+        :param region: Zinc region to define model in. Must be empty unless allocators are supplied.
         :param options: Dict containing options. See getDefaultOptions().
-        :return: None
+        :param nodeIdentifierAllocator, elementIdentifierAllocator: Optional IdentifierAllocator
+        for nodes and elements, shared with the ventricles mesh this adds to. If None, they are
+        created for the region's nodes and mesh.
+        :return: list of AnnotationGroup
         """
         elementsCountAroundLVFreeWall = options['Number of elements around LV free wall']
         elementsCountAroundSeptum = options['Number of elements around septum']
@@ -145,15 +148,23 @@ class MeshType_3d_heartventriclesbase2(object):
         outletInclineRadians = math.radians(options['Outlet incline degrees'])
         outletSpacing = options['Outlet spacing']
 
+        fm = region.getFieldmodule()
+        nodes = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        mesh = fm.findMeshByDimension(3)
+        if nodeIdentifierAllocator is None:
+            nodeIdentifierAllocator = IdentifierAllocator(nodes)
+        if elementIdentifierAllocator is None:
+            elementIdentifierAllocator = IdentifierAllocator(mesh)
+        firstNodeIdentifier = nodeIdentifierAllocator.getNextIdentifier()
+
         # generate heartventricles2 model to add base plane to
-        annotationGroups = MeshType_3d_heartventricles2.generateBaseMesh(region, options)
+        annotationGroups = MeshType_3d_heartventricles2.generateBaseMesh(region, options, nodeIdentifierAllocator, elementIdentifierAllocator)
         lvGroup = findAnnotationGroupByName(annotationGroups, 'left ventricle')
         rvGroup = findAnnotationGroupByName(annotationGroups, 'right ventricle')
         septumGroup = findAnnotationGroupByName(annotationGroups, 'interventricular septum')
         conusArteriosusGroup = AnnotationGroup(region, 'conus arteriosus', FMANumber = 0, lyphID = 'Lyph ID unknown')
         annotationGroups += [ conusArteriosusGroup ]
 
-        fm = region.getFieldmodule()
         fm.beginChange()
         coordinates = getOrCreateCoordinateField(fm)
         cache = fm.createFieldcache()
@@ -162,7 +173,6 @@ class MeshType_3d_heartventriclesbase2(object):
         # Create nodes
         #################
 
-        nodes = fm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
         nodetemplate = nodes.createNodetemplate()
         nodetemplate.defineField(coordinates)
         nodetemplate.setValueNumberOfVersions(coordinates, -1, Node.VALUE_LABEL_VALUE, 1)
@@ -176,19 +186,17 @@ class MeshType_3d_heartventriclesbase2(object):
         nodetemplateLinearS3.setValueNumberOfVersions(coordinates, -1, Node.VALUE_LABEL_D_DS1, 1)
         nodetemplateLinearS3.setValueNumberOfVersions(coordinates, -1, Node.VALUE_LABEL_D_DS2, 1)
 
-        nodeIdentifier = startNodeIdentifier = getMaximumNodeIdentifier(nodes) + 1
-
         # node offsets for row, wall in LV, plus first LV node on inside top
         norl = elementsCountAroundLV
         nowl = 1 + elementsCountUpLV*norl
-        nidl = nowl - norl + 1
+        nidl = firstNodeIdentifier + nowl - norl
         # make constants for end of septum and LV
         nsdl = nidl + elementsCountAroundSeptum
         nedl = nidl + elementsCountAroundLV
         # node offsets for row, wall in RV, plus first RV node on inside top
         norr = elementsCountAroundRV - 1
         nowr = elementsCountUpRV*norr
-        nidr = nowl*2 + 1 + nowr - norr
+        nidr = firstNodeIdentifier + nowl*2 + nowr - norr
         #print('nidl',nidl,'nidr',nidr)
 
         # LV outlet
@@ -251,6 +259,7 @@ class MeshType_3d_heartventriclesbase2(object):
                 for c in range(3):
                     x[c] = lvOutletCentre[c] + loAxis1[c]*cosRadiansAround + loAxis2[c]*sinRadiansAround
                     dx_ds1[c] = radiansPerElementAroundOutlet*(loAxis1[c]*-sinRadiansAround + loAxis2[c]*cosRadiansAround)
+                nodeIdentifier = nodeIdentifierAllocator.allocate()
                 node = nodes.createNode(nodeIdentifier, nodetemplateLinearS3 if (n3 == 0) else nodetemplate)
                 outletNodeId.append(nodeIdentifier)
                 cache.setNode(node)
@@ -278,7 +287,6 @@ class MeshType_3d_heartventriclesbase2(object):
                         cruxLeft = [ x[0], x[1], x[2] ]
                     elif n1 == 3:
                         lvOutletOuterSpaceX = [ x[0], x[1], x[2] ]
-                nodeIdentifier += 1
             lvOutletNodeId.append(outletNodeId)
 
         # RV outlet - for bicubic-linear tube connection
@@ -308,6 +316,7 @@ class MeshType_3d_heartventriclesbase2(object):
                     x[c] = rvOutletCentre[c] + roAxis1[c]*cosRadiansAround + roAxis2[c]*sinRadiansAround
                     dx_ds1[c] = radiansPerElementAroundOutlet*(roAxis1[c]*-sinRadiansAround + roAxis2[c]*cosRadiansAround)
                 hasDerivative3 = (n3 == 1) and (n1 in [ 0, 5 ])
+                nodeIdentifier = nodeIdentifierAllocator.allocate()
                 node = nodes.createNode(nodeIdentifier, nodetemplate if hasDerivative3 else nodetemplateLinearS3)
                 outletNodeId.append(nodeIdentifier)
                 cache.setNode(node)
@@ -328,7 +337,6 @@ class MeshType_3d_heartventriclesbase2(object):
                     coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
                     if n1 == 0:
                         rvOutletOuterSpaceX = [ x[0], x[1], x[2] ]
-                nodeIdentifier += 1
             rvOutletNodeId.append(outletNodeId)
 
         # fix derivative 3 between lv, rv outlets
@@ -437,17 +445,15 @@ class MeshType_3d_heartventriclesbase2(object):
         #print('total length', atrialSeptumElementLength*(elementsCountAtrialSeptum + 1) + 2*atrialTransitionElementLength \
         #    + (elementsCountAroundAtria - elementsCountAtrialSeptum - 3)*atrialFreeWallElementLength, 'vs.', atrialPerimeterLength)
 
-        laRadians = []
+        elementLengths = []
         laOuterDerivatives = []
-        radiansAround = laSeptumRadians
         if (elementsCountAtrialSeptum % 2) == 1:
-            radiansAround = updateEllipseAngleByArcLength(aOuterMajorMag, aOuterMinorMag, radiansAround, 0.5*atrialSeptumElementLength)
+            elementLengths.append(0.5*atrialSeptumElementLength)
         outerDerivative = atrialSeptumElementLength
         lan1CruxLimit = elementsCountAtrialSeptum//2 + 1
         lan1SeptumLimit = elementsCountAroundAtria - (elementsCountAtrialSeptum + 1)//2 - 1
         #print('lan1CruxLimit', lan1CruxLimit, 'lan1SeptumLimit', lan1SeptumLimit)
-        for n1 in range(elementsCountAroundAtria):
-            laRadians.append(radiansAround)
+        for n1 in range(elementsCountAroundAtria - 1):
             laOuterDerivatives.append(outerDerivative)
             if (n1 < lan1CruxLimit) or (n1 > lan1SeptumLimit):
                 elementLength = atrialSeptumElementLength
@@ -462,7 +468,12 @@ class MeshType_3d_heartventriclesbase2(object):
                 elementLength = atrialFreeWallElementLength
                 outerDerivative = atrialFreeWallElementLength
             #print(n1,': elementLength', elementLength, 'outerDerivative', outerDerivative)
-            radiansAround = updateEllipseAngleByArcLength(aOuterMajorMag, aOuterMinorMag, radiansAround, elementLength)
+            elementLengths.append(elementLength)
+        laOuterDerivatives.append(outerDerivative)
+        # get all angles around at once, skipping the half septum element if any
+        laRadians, points, tangents = getEllipsePointsAtArcLengths(aOuterMajorMag, aOuterMinorMag, laSeptumRadians, elementLengths)
+        if (elementsCountAtrialSeptum % 2) == 1:
+            laRadians = laRadians[1:]
         laInnerDerivatives = []
         finalArcLength = prevArcLength = getEllipseArcLength(aInnerMajorMag, aInnerMinorMag, laRadians[-1] - 2.0*math.pi, laRadians[0])
         for n1 in range(elementsCountAroundAtria):
@@ -509,6 +520,7 @@ class MeshType_3d_heartventriclesbase2(object):
 
                 if (n3 == 1) and ((n1 <= lan1CruxLimit) or (n1 > (lan1SeptumLimit + 2))):
                     continue  # already have a node from crux or will get from right atrial septum
+                nodeIdentifier = nodeIdentifierAllocator.allocate()
                 node = nodes.createNode(nodeIdentifier, nodetemplate)
                 laNodeId[n3][n1] = nodeIdentifier
                 cache.setNode(node)
@@ -547,25 +559,24 @@ class MeshType_3d_heartventriclesbase2(object):
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-                nodeIdentifier += 1
 
         if False:
             # show axes of left atrium
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ laCentreX, laCentreY, aCentreInnerZ ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ laInnerMajor[0], laInnerMajor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ laInnerMinor[0], laInnerMinor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, aCentreInnerZ ])
-            nodeIdentifier += 1
 
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ laCentreX, laCentreY, aCentreOuterZ ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ laOuterMajor[0], laOuterMajor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ laOuterMinor[0], laOuterMinor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, aCentreOuterZ ])
-            nodeIdentifier += 1
 
         ran1SeptumLimit = elementsCountAtrialSeptum//2
         ran1CruxLimit = elementsCountAroundAtria - ran1SeptumLimit - 1
@@ -590,6 +601,7 @@ class MeshType_3d_heartventriclesbase2(object):
 
                 if (n3 == 1) and ((n1 < ran1SeptumLimit) or (n1 >= ran1CruxLimit)):
                     continue  # already have a node from crux or will get from left atrial septum
+                nodeIdentifier = nodeIdentifierAllocator.allocate()
                 node = nodes.createNode(nodeIdentifier, nodetemplate)
                 raNodeId[n3][n1] = nodeIdentifier
                 cache.setNode(node)
@@ -628,25 +640,24 @@ class MeshType_3d_heartventriclesbase2(object):
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, dx_ds1)
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
                 coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
-                nodeIdentifier += 1
 
         if False:
             # show axes of right atrium
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ raCentreX, raCentreY, aCentreInnerZ ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ raInnerMajor[0], raInnerMajor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ raInnerMinor[0], raInnerMinor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, aCentreInnerZ ])
-            nodeIdentifier += 1
 
+            nodeIdentifier = nodeIdentifierAllocator.allocate()
             node = nodes.createNode(nodeIdentifier, nodetemplate)
             cache.setNode(node)
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, [ raCentreX, raCentreY, aCentreOuterZ ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS1, 1, [ raOuterMajor[0], raOuterMajor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, [ raOuterMinor[0], raOuterMinor[1], 0.0 ])
             result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, [ 0.0, 0.0, aCentreOuterZ ])
-            nodeIdentifier += 1
 
         laNodeId[1][0] = raNodeId[0][0]
         laNodeId[1][1] = lvOutletNodeId[1][ 0]
@@ -701,16 +712,29 @@ class MeshType_3d_heartventriclesbase2(object):
         dx_ds2 = [ scale2*d for d in dx_ds2 ]
         result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2 )
 
-        # create node on top of lv 'crest'
+        # interpolate nodes on top of lv 'crest' and bottom of lv 'bridge' between la and lo together
         nida = nsdl + nowl
         nidb = lvOutletNodeId[1][-2]
         #print('lv crest interpolated from nodes', nida, nidb)
         node1 = nodes.findNodeByIdentifier(nida)
         node2 = nodes.findNodeByIdentifier(nidb)
-        x, dx_ds2, dx_ds1, dx_ds3 = interpolateNodesCubicHermite(cache, coordinates, 0.5, baseThickness, \
-            node1, Node.VALUE_LABEL_D_DS2,  1.0, Node.VALUE_LABEL_D_DS1, 1.0, \
-            node2, Node.VALUE_LABEL_D_DS3, -1.0, Node.VALUE_LABEL_D_DS1, 1.0)
+        nida = laNodeId[0][2]
+        nidb = lvOutletNodeId[0][-1]
+        #print('lv bridge interpolated from nodes', nida, nidb)
+        node3 = nodes.findNodeByIdentifier(nida)
+        node4 = nodes.findNodeByIdentifier(nidb)
+        xList, dx_ds2List, dx_ds1List, dx_ds3List = interpolateNodesCubicHermiteList(cache, coordinates, [
+            ( 0.5, baseThickness,
+              node1, Node.VALUE_LABEL_D_DS2,  1.0, Node.VALUE_LABEL_D_DS1,  1.0,
+              node2, Node.VALUE_LABEL_D_DS3, -1.0, Node.VALUE_LABEL_D_DS1,  1.0 ),
+            ( 0.4, lvOutletWallThickness,
+              node3, Node.VALUE_LABEL_D_DS2, -1.0, Node.VALUE_LABEL_D_DS1, -1.0,
+              node4, Node.VALUE_LABEL_D_DS2,  1.0, Node.VALUE_LABEL_D_DS1,  1.0 ) ])
+
+        # create node on top of lv 'crest'
+        x, dx_ds2, dx_ds1, dx_ds3 = xList[0], dx_ds2List[0], dx_ds1List[0], dx_ds3List[0]
 
+        nodeIdentifier = nodeIdentifierAllocator.allocate()
         node = nodes.createNode(nodeIdentifier, nodetemplate)
         cache.setNode(node)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x)
@@ -718,7 +742,6 @@ class MeshType_3d_heartventriclesbase2(object):
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
         lv_crest_nid1 = nodeIdentifier
-        nodeIdentifier += 1
 
         # create nodes on bottom and top of rv supraventricular crest
         nida = nidr + nowr + 4
@@ -750,6 +773,7 @@ class MeshType_3d_heartventriclesbase2(object):
         curvatureScale = 1.0 - baseThickness*getCubicHermiteCurvature(xa, d2a, x, dx_ds2, radialVector, 1.0)
         dx_ds2_inner = [ curvatureScale*d for d in dx_ds2 ]
 
+        nodeIdentifier = nodeIdentifierAllocator.allocate()
         node = nodes.createNode(nodeIdentifier, nodetemplate)
         cache.setNode(node)
         result = coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x_inner)
@@ -757,8 +781,8 @@ class MeshType_3d_heartventriclesbase2(object):
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2_inner)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
         rv_crest_nid1 = nodeIdentifier
-        nodeIdentifier += 1
 
+        nodeIdentifier = nodeIdentifierAllocator.allocate()
         node = nodes.createNode(nodeIdentifier, nodetemplate)
         cache.setNode(node)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x)
@@ -766,20 +790,13 @@ class MeshType_3d_heartventriclesbase2(object):
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
         rv_crest_nid2 = nodeIdentifier
-        nodeIdentifier += 1
 
         # create node on bottom of lv 'bridge' between la and lo
-        nida = laNodeId[0][2]
-        nidb = lvOutletNodeId[0][-1]
-        #print('lv bridge interpolated from nodes', nida, nidb)
-        node1 = nodes.findNodeByIdentifier(nida)
-        node2 = nodes.findNodeByIdentifier(nidb)
-        x, dx_ds2, dx_ds1, dx_ds3 = interpolateNodesCubicHermite(cache, coordinates, 0.4, lvOutletWallThickness, \
-            node1, Node.VALUE_LABEL_D_DS2, -1.0, Node.VALUE_LABEL_D_DS1, -1.0, \
-            node2, Node.VALUE_LABEL_D_DS2,  1.0, Node.VALUE_LABEL_D_DS1,  1.0)
+        x, dx_ds2, dx_ds1, dx_ds3 = xList[1], dx_ds2List[1], dx_ds1List[1], dx_ds3List[1]
         # dx_ds1 needs to be larger
         dx_ds1 = [ 2.0*d  for d in dx_ds1 ]
 
+        nodeIdentifier = nodeIdentifierAllocator.allocate()
         node = nodes.createNode(nodeIdentifier, nodetemplateLinearS3)
         cache.setNode(node)
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, x)
@@ -787,14 +804,11 @@ class MeshType_3d_heartventriclesbase2(object):
         coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS2, 1, dx_ds2)
         #coordinates.setNodeParameters(cache, -1, Node.VALUE_LABEL_D_DS3, 1, dx_ds3)
         lv_bridge_nid1 = nodeIdentifier
-        nodeIdentifier += 1
 
         #################
         # Create elements
         #################
 
-        mesh = fm.findMeshByDimension(3)
-
         lvMeshGroup = lvGroup.getMeshGroup(mesh)
         rvMeshGroup = rvGroup.getMeshGroup(mesh)
         septumMeshGroup = septumGroup.getMeshGroup(mesh)
@@ -803,8 +817,6 @@ class MeshType_3d_heartventriclesbase2(object):
         tricubichermite = eftfactory_tricubichermite(mesh, useCrossDerivatives)
         eft = tricubichermite.createEftNoCrossDerivatives()
 
-        elementIdentifier = startElementIdentifier = getMaximumElementIdentifier(mesh) + 1
-
         elementtemplate1 = mesh.createElementtemplate()
         elementtemplate1.setElementShapeType(Element.SHAPE_TYPE_CUBE)
 
@@ -1045,6 +1057,7 @@ class MeshType_3d_heartventriclesbase2(object):
                 remapEftNodeValueLabel(eft1, [ 8 ], Node.VALUE_LABEL_D_DS2, [ ( Node.VALUE_LABEL_D_DS1, [] ), ( Node.VALUE_LABEL_D_DS3, [1] ) ])
 
             result = elementtemplate1.defineField(coordinates, -1, eft1)
+            elementIdentifier = elementIdentifierAllocator.allocate()
             element = mesh.createElement(elementIdentifier, elementtemplate1)
             result2 = element.setNodesByIdentifier(eft1, nids)
             if eft1.getNumberOfLocalScaleFactors() == 1:
@@ -1052,7 +1065,6 @@ class MeshType_3d_heartventriclesbase2(object):
             else:
                 result3 = 1
             #print('create element lv', elementIdentifier, result, result2, result3, nids)
-            elementIdentifier += 1
 
             for meshGroup in meshGroups:
                 meshGroup.addElement(element)
@@ -1246,6 +1258,7 @@ class MeshType_3d_heartventriclesbase2(object):
                 meshGroups += [ conusArteriosusMeshGroup ]
 
             result = elementtemplate1.defineField(coordinates, -1, eft1)
+            elementIdentifier = elementIdentifierAllocator.allocate()
             element = mesh.createElement(elementIdentifier, elementtemplate1)
             result2 = element.setNodesByIdentifier(eft1, nids)
             if eft1.getNumberOfLocalScaleFactors() == 1:
@@ -1253,7 +1266,6 @@ class MeshType_3d_heartventriclesbase2(object):
             else:
                 result3 = 1
             #print('create element rv', elementIdentifier, result, result2, result3, nids)
-            elementIdentifier += 1
 
             for meshGroup in meshGroups:
                 meshGroup.addElement(element)
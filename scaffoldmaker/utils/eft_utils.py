@@ -5,6 +5,8 @@ Created on Jan 4, 2018
 @author: Richard Christie
 '''
 from opencmiss.zinc.element import Elementfieldtemplate
+from opencmiss.zinc.node import Node
+from opencmiss.zinc.status import OK as ZINC_OK, ERROR_ARGUMENT as ZINC_ERROR_ARGUMENT
 
 def mapEftFunction1Node1Term(eft, function, localNode, valueLabel, version, scaleFactors):
     '''
@@ -133,3 +135,226 @@ def remapEftNodeValueLabelWithNodes(eft, localNodeIndex, fromValueLabel, express
                     eft.setTermNodeParameter(f, t, expressionTerm[0], expressionTerm[1], version)
                     if expressionTerm[2]:
                         eft.setTermScaling(f, t, expressionTerm[2])
+
+class EftMirror:
+    '''
+    Python copy of the functions and terms of a Zinc element field template using node
+    parameter mapping, so the eft_utils functions can remap it without Zinc calls per
+    query. Duck-types the Zinc Elementfieldtemplate term methods; other methods e.g. scale
+    factor setup pass through to the Zinc template. applyModification() applies the remap
+    and scale functions of this module directly to the mirrored terms.
+    Changes to functions and terms are only written to Zinc by commit(), setting only the
+    functions that were modified.
+    Usage:
+        eftMirror = EftMirror(eft)
+        eftMirror.applyModification(remapEftNodeValueLabel, ( ... ))
+        eftMirror.applyModification(remapEftLocalNodes, ( ... ))
+        eftMirror.commit()
+    '''
+
+    def __init__(self, eft):
+        '''
+        :param eft: Zinc element field template to mirror. Must not be modified directly
+        until commit() is called.
+        '''
+        assert eft.getParameterMappingMode() == Elementfieldtemplate.PARAMETER_MAPPING_MODE_NODE, \
+            'EftMirror: element field template does not use node parameter mapping'
+        self._eft = eft
+        self._localNodesCount = eft.getNumberOfLocalNodes()
+        self._committedLocalNodesCount = self._localNodesCount
+        # terms cannot be scaled without local scale factors
+        scaled = eft.getNumberOfLocalScaleFactors() > 0
+        # list over functions of list over terms of [ localNodeIndex, valueLabel, version, scaleFactorIndexes ]
+        self._functionsTerms = []
+        for f in range(1, eft.getNumberOfFunctions() + 1):
+            self._functionsTerms.append([ [ eft.getTermLocalNodeIndex(f, t), eft.getTermNodeValueLabel(f, t), eft.getTermNodeVersion(f, t),
+                getEftTermScaling(eft, f, t) if scaled else [] ] for t in range(1, eft.getFunctionNumberOfTerms(f) + 1) ])
+        self._modifiedFunctions = set()
+
+    def __getattr__(self, name):
+        '''
+        Pass through methods not mirrored to the Zinc element field template.
+        '''
+        return getattr(self._eft, name)
+
+    def getElementfieldtemplate(self):
+        '''
+        :return: The Zinc element field template mirrored. Call commit() before using it.
+        '''
+        return self._eft
+
+    def commit(self):
+        '''
+        Write modified functions and number of local nodes to the Zinc element field template.
+        '''
+        eft = self._eft
+        if self._localNodesCount > self._committedLocalNodesCount:
+            eft.setNumberOfLocalNodes(self._localNodesCount)
+        for f in sorted(self._modifiedFunctions):
+            functionTerms = self._functionsTerms[f - 1]
+            eft.setFunctionNumberOfTerms(f, len(functionTerms))
+            t = 1
+            for localNodeIndex, valueLabel, version, scaleFactorIndexes in functionTerms:
+                eft.setTermNodeParameter(f, t, localNodeIndex, valueLabel, version)
+                eft.setTermScaling(f, t, scaleFactorIndexes)
+                t += 1
+        if self._localNodesCount < self._committedLocalNodesCount:
+            eft.setNumberOfLocalNodes(self._localNodesCount)
+        self._committedLocalNodesCount = self._localNodesCount
+        self._modifiedFunctions = set()
+
+    def validate(self):
+        '''
+        Commit changes and validate the Zinc element field template.
+        :return: True if valid, otherwise False.
+        '''
+        self.commit()
+        return self._eft.validate()
+
+    def applyModification(self, function, args):
+        '''
+        Apply function(eft, *args) to the mirrored template. The remap and scale functions
+        of this module are applied by the equivalent mirror methods; other functions are
+        called with the mirror standing in for the Zinc element field template.
+        '''
+        if function is remapEftNodeValueLabel:
+            localNodeIndexes, fromValueLabel, expressionTerms = args
+            self.remapNodeValueLabel(localNodeIndexes, fromValueLabel, [ (None, expressionTerm[0], expressionTerm[1]) for expressionTerm in expressionTerms ])
+        elif function is remapEftNodeValueLabelWithNodes:
+            localNodeIndex, fromValueLabel, expressionTerms = args
+            self.remapNodeValueLabel([ localNodeIndex ], fromValueLabel, expressionTerms)
+        elif function is scaleEftNodeValueLabels:
+            self.scaleNodeValueLabels(*args)
+        elif function is remapEftLocalNodes:
+            self.remapLocalNodes(*args)
+        else:
+            function(self, *args)
+
+    def remapLocalNodes(self, newNodeCount, localNodeIndexes):
+        '''
+        See remapEftLocalNodes().
+        '''
+        f = 1
+        for functionTerms in self._functionsTerms:
+            if functionTerms:
+                for term in functionTerms:
+                    term[0] = localNodeIndexes[term[0] - 1]
+                self._modifiedFunctions.add(f)
+            f += 1
+        self._localNodesCount = newNodeCount
+
+    def scaleNodeValueLabels(self, localNodeIndexes, valueLabels, addScaleFactorIndexes):
+        '''
+        See scaleEftNodeValueLabels().
+        '''
+        f = 1
+        for functionTerms in self._functionsTerms:
+            for term in functionTerms:
+                if (term[0] in localNodeIndexes) and (term[1] in valueLabels):
+                    term[3] = term[3] + list(addScaleFactorIndexes)
+                    self._modifiedFunctions.add(f)
+            f += 1
+
+    def remapNodeValueLabel(self, localNodeIndexes, fromValueLabel, expressionTerms):
+        '''
+        Remap single unscaled terms for fromValueLabel at any of localNodeIndexes to
+        expressionTerms, keeping version. See remapEftNodeValueLabel().
+        :param expressionTerms: List of (localNodeIndex, valueLabel, scaleFactorIndexesList)
+        to remap to. localNodeIndex None keeps local node index of the remapped term.
+        '''
+        f = 1
+        for functionTerms in self._functionsTerms:
+            if len(functionTerms) == 1:
+                localNodeIndex, valueLabel, version, scaleFactorIndexes = functionTerms[0]
+                if (valueLabel == fromValueLabel) and (localNodeIndex in localNodeIndexes) and (not scaleFactorIndexes):
+                    functionTerms[:] = [ [ localNodeIndex if (expressionTerm[0] is None) else expressionTerm[0],
+                        expressionTerm[1], version, list(expressionTerm[2]) ] for expressionTerm in expressionTerms ]
+                    self._modifiedFunctions.add(f)
+            f += 1
+
+    def getNumberOfFunctions(self):
+        return len(self._functionsTerms)
+
+    def getNumberOfLocalNodes(self):
+        return self._localNodesCount
+
+    def setNumberOfLocalNodes(self, number):
+        if number < 1:
+            return ZINC_ERROR_ARGUMENT
+        self._localNodesCount = number
+        return ZINC_OK
+
+    def getFunctionNumberOfTerms(self, functionIndex):
+        if not (1 <= functionIndex <= len(self._functionsTerms)):
+            return -1
+        return len(self._functionsTerms[functionIndex - 1])
+
+    def setFunctionNumberOfTerms(self, functionIndex, newNumberOfTerms):
+        '''
+        As for Zinc, added terms are on invalid local node 0, VALUE label, version 1, unscaled.
+        '''
+        if (not (1 <= functionIndex <= len(self._functionsTerms))) or (newNumberOfTerms < 0):
+            return ZINC_ERROR_ARGUMENT
+        functionTerms = self._functionsTerms[functionIndex - 1]
+        del functionTerms[newNumberOfTerms:]
+        while len(functionTerms) < newNumberOfTerms:
+            functionTerms.append([ 0, Node.VALUE_LABEL_VALUE, 1, [] ])
+        self._modifiedFunctions.add(functionIndex)
+        return ZINC_OK
+
+    def _getTerm(self, functionIndex, termIndex):
+        '''
+        :return: Mirrored term list or None if invalid indexes.
+        '''
+        if 1 <= functionIndex <= len(self._functionsTerms):
+            functionTerms = self._functionsTerms[functionIndex - 1]
+            if 1 <= termIndex <= len(functionTerms):
+                return functionTerms[termIndex - 1]
+        return None
+
+    def getTermLocalNodeIndex(self, functionIndex, termIndex):
+        term = self._getTerm(functionIndex, termIndex)
+        return term[0] if term else 0
+
+    def getTermNodeValueLabel(self, functionIndex, termIndex):
+        term = self._getTerm(functionIndex, termIndex)
+        return term[1] if term else Node.VALUE_LABEL_INVALID
+
+    def getTermNodeVersion(self, functionIndex, termIndex):
+        term = self._getTerm(functionIndex, termIndex)
+        return term[2] if term else 0
+
+    def setTermNodeParameter(self, functionIndex, termIndex, localNodeIndex, valueLabel, version):
+        '''
+        As for Zinc, keeps existing term scaling.
+        '''
+        term = self._getTerm(functionIndex, termIndex)
+        if (not term) or (not (1 <= localNodeIndex <= self._localNodesCount)) or (version < 1):
+            return ZINC_ERROR_ARGUMENT
+        term[0:3] = [ localNodeIndex, valueLabel, version ]
+        self._modifiedFunctions.add(functionIndex)
+        return ZINC_OK
+
+    def getTermScaling(self, functionIndex, termIndex, indexesCount):
+        '''
+        :return: Number of scale factor indexes, first or list of indexesCount indexes as for Zinc.
+        '''
+        term = self._getTerm(functionIndex, termIndex)
+        if not term:
+            return -1, 0 if (indexesCount == 1) else []
+        scaleFactorIndexes = term[3]
+        if indexesCount == 1:
+            return len(scaleFactorIndexes), scaleFactorIndexes[0] if scaleFactorIndexes else 0
+        return len(scaleFactorIndexes), scaleFactorIndexes[:indexesCount]
+
+    def setTermScaling(self, functionIndex, termIndex, indexes):
+        term = self._getTerm(functionIndex, termIndex)
+        if not term:
+            return ZINC_ERROR_ARGUMENT
+        scaleFactorsCount = self._eft.getNumberOfLocalScaleFactors()
+        for scaleFactorIndex in indexes:
+            if not (1 <= scaleFactorIndex <= scaleFactorsCount):
+                return ZINC_ERROR_ARGUMENT
+        term[3] = list(indexes)
+        self._modifiedFunctions.add(functionIndex)
+        return ZINC_OK
@@ -12,6 +12,14 @@ from opencmiss.zinc.node import Node
 from opencmiss.zinc.status import OK as ZINC_OK
 import math
 
+def _getRecipeKey(value):
+    '''
+    :return: value with all lists converted to tuples, recursively, so it can be hashed.
+    '''
+    if isinstance(value, (list, tuple)):
+        return tuple(_getRecipeKey(v) for v in value)
+    return value
+
 class eftfactory_tricubichermite:
     '''
     Factory class for creating element field templates for a 3-D mesh using tricubic Hermite basis.
@@ -27,6 +35,32 @@ class eftfactory_tricubichermite:
         self._useCrossDerivatives = useCrossDerivatives
         self._fieldmodule = mesh.getFieldmodule()
         self._tricubicHermiteBasis = self._fieldmodule.createElementbasis(3, Elementbasis.FUNCTION_TYPE_CUBIC_HERMITE)
+        # map from recipe key to element field template built from it
+        self._recipeEfts = {}
+
+    def getEftFromRecipe(self, createEft, createArgs = (), modifications = []):
+        '''
+        Get element field template built by calling createEft(*createArgs) then applying
+        each of modifications in order. Returns the template already built for an
+        identical recipe if any, so it must not be modified by the caller.
+        :param createEft: A createEft method of this factory.
+        :param createArgs: Arguments to pass to createEft.
+        :param modifications: List of (function, args) where function takes eft as its first
+        argument followed by args, applied to an EftMirror of the template, e.g. (remapEftNodeValueLabel, ([ 1 ], Node.VALUE_LABEL_D_DS3,
+        [ (Node.VALUE_LABEL_D_DS2, []) ])). Args must be values, lists or tuples.
+        :return: Element field template
+        '''
+        key = (createEft.__name__, _getRecipeKey(createArgs), tuple((function, _getRecipeKey(args)) for function, args in modifications))
+        eft = self._recipeEfts.get(key)
+        if eft is None:
+            eft = createEft(*createArgs)
+            if modifications:
+                eftMirror = EftMirror(eft)
+                for function, args in modifications:
+                    eftMirror.applyModification(function, args)
+                assert eftMirror.validate(), 'eftfactory_tricubichermite.getEftFromRecipe:  Failed to validate eft'
+            self._recipeEfts[key] = eft
+        return eft
 
     def createEftBasic(self):
         '''
@@ -0,0 +1,129 @@
+'''
+Class for extracting the parameters multiplying element basis functions.
+Created on Oct 17, 2026
+'''
+
+from scaffoldmaker.utils.eft_utils import getEftTermScaling
+from opencmiss.zinc.element import Elementfieldtemplate
+from opencmiss.zinc.result import RESULT_OK as ZINC_OK
+
+def getEftTermsMap(eft):
+    '''
+    Walk all functions and terms of eft to get a hashable description of how it
+    maps node parameters to element basis function parameters.
+    :param eft: Zinc Elementfieldtemplate using node parameter mapping.
+    :return: Tuple(basis function types in each xi direction, number of local nodes,
+    tuple over functions of tuple over terms of (localNodeIndex, valueLabel, version,
+    tuple(scaleFactorIndexes))).
+    '''
+    basis = eft.getElementbasis()
+    functionTypes = tuple(basis.getFunctionType(c + 1) for c in range(basis.getDimension()))
+    functionsTerms = []
+    for f in range(1, eft.getNumberOfFunctions() + 1):
+        functionsTerms.append(tuple((eft.getTermLocalNodeIndex(f, t), eft.getTermNodeValueLabel(f, t),
+            eft.getTermNodeVersion(f, t), tuple(getEftTermScaling(eft, f, t))) for t in range(1, eft.getFunctionNumberOfTerms(f) + 1)))
+    return (functionTypes, eft.getNumberOfLocalNodes(), tuple(functionsTerms))
+
+
+class ElementParameters:
+    '''
+    Extracts the effective parameters multiplying each basis function of a finite
+    element field, summing the general linear maps of node parameters, versions and
+    scale factors in each element's field template.
+    Node parameters are read once and cached, so assumes the field is not modified
+    while in use.
+    '''
+
+    def __init__(self, field):
+        '''
+        :param field: Zinc finite element field to extract parameters of.
+        '''
+        self._field = field.castFiniteElement()
+        assert self._field.isValid(), 'ElementParameters: field is not finite element type'
+        self._componentsCount = self._field.getNumberOfComponents()
+        self._fieldmodule = self._field.getFieldmodule()
+        self._cache = self._fieldmodule.createFieldcache()
+        # map from terms map to the single instance of it, so identical EFTs share one map
+        self._eftTermsMaps = {}
+        # map from (node identifier, valueLabel, version) to parameters
+        self._nodeParameters = {}
+
+    def getElementTermsMap(self, element):
+        '''
+        Get the terms map of the field's element field template in element, shared by
+        all elements with an identical template.
+        Zinc returns a new template object per element so every template is walked, but
+        only one map is kept for each distinct template.
+        :return: Terms map, see getEftTermsMap(), element field template; or None, None
+        if field is not defined on element with node parameter mapping.
+        '''
+        eft = element.getElementfieldtemplate(self._field, -1)
+        if (not eft.isValid()) or (eft.getParameterMappingMode() != Elementfieldtemplate.PARAMETER_MAPPING_MODE_NODE):
+            return None, None
+        termsMap = getEftTermsMap(eft)
+        return self._eftTermsMaps.setdefault(termsMap, termsMap), eft
+
+    def getElementParameters(self, element, termsMap = None, eft = None):
+        '''
+        Get the parameters multiplying each basis function of the field in element.
+        :param termsMap, eft: Optional terms map and element field template already
+        obtained from getElementTermsMap(element), to avoid walking the template again.
+        :return: Basis function types in each xi direction, list over basis functions in
+        Zinc order of list of component parameters; or None, None if field is not defined
+        with node parameter mapping or any node parameter is not found.
+        '''
+        if termsMap is None:
+            termsMap, eft = self.getElementTermsMap(element)
+            if termsMap is None:
+                return None, None
+        functionTypes, localNodesCount, functionsTerms = termsMap
+        scaleFactors = []
+        for s in range(eft.getNumberOfLocalScaleFactors()):
+            result, scaleFactor = element.getScaleFactor(eft, s + 1)
+            scaleFactors.append(scaleFactor)
+        nodes = [ element.getNode(eft, n + 1) for n in range(localNodesCount) ]
+        nodeIdentifiers = [ node.getIdentifier() for node in nodes ]
+        componentsRange = range(self._componentsCount)
+        parameters = []
+        for functionTerms in functionsTerms:
+            parameter = [ 0.0 ]*self._componentsCount
+            for localNodeIndex, valueLabel, version, scaleFactorIndexes in functionTerms:
+                key = (nodeIdentifiers[localNodeIndex - 1], valueLabel, version)
+                value = self._nodeParameters.get(key)
+                if value is None:
+                    self._cache.setNode(nodes[localNodeIndex - 1])
+                    result, value = self._field.getNodeParameters(self._cache, -1, valueLabel, version, self._componentsCount)
+                    if result != ZINC_OK:
+                        return None, None
+                    if self._componentsCount == 1:
+                        value = [ value ]
+                    self._nodeParameters[key] = value
+                scale = 1.0
+                for scaleFactorIndex in scaleFactorIndexes:
+                    scale *= scaleFactors[scaleFactorIndex - 1]
+                for c in componentsRange:
+                    parameter[c] += scale*value[c]
+            parameters.append(parameter)
+        return functionTypes, parameters
+
+    def getMeshParameters(self, mesh):
+        '''
+        Get element parameters for all elements in mesh or mesh group.
+        :param mesh: Zinc Mesh or MeshGroup.
+        :return: list of element identifiers, list of basis function types for each
+        element, list of parameters for each element. See getElementParameters().
+        '''
+        elementIdentifiers = []
+        functionTypesList = []
+        parametersList = []
+        self._fieldmodule.beginChange()
+        elementiterator = mesh.createElementiterator()
+        element = elementiterator.next()
+        while element.isValid():
+            functionTypes, parameters = self.getElementParameters(element)
+            elementIdentifiers.append(element.getIdentifier())
+            functionTypesList.append(functionTypes)
+            parametersList.append(parameters)
+            element = elementiterator.next()
+        self._fieldmodule.endChange()
+        return elementIdentifiers, functionTypesList, parametersList
@@ -0,0 +1,51 @@
+'''
+Class for sharing element templates between elements using the same element field template.
+Created on Oct 17, 2026
+'''
+
+from opencmiss.zinc.element import Element
+
+class ElementtemplatePool:
+    '''
+    Pool of element templates for a mesh, each defining a field with one element field
+    template. Elements using the same element field template share one element template,
+    so the number of templates defined grows with the number of distinct element field
+    templates, not the number of elements.
+    Element field templates are identified by object identity, so callers should also
+    share them e.g. by getting them from eftfactory_tricubichermite.getEftFromRecipe().
+    An element field template must not be modified after its template is obtained.
+    '''
+
+    def __init__(self, mesh, field, shapeType = Element.SHAPE_TYPE_CUBE):
+        '''
+        :param mesh: Zinc mesh to create element templates in.
+        :param field: Zinc finite element field to define on element templates.
+        :param shapeType: Zinc Element.SHAPE_TYPE to set on element templates.
+        '''
+        self._mesh = mesh
+        self._field = field
+        self._shapeType = shapeType
+        # map from id(eft) to (eft, elementtemplate); holding eft keeps its id unique
+        self._elementtemplates = {}
+
+    def getElementtemplate(self, eft):
+        '''
+        Get element template defining field with eft, creating it on first use.
+        :param eft: Zinc element field template.
+        :return: Zinc element template
+        '''
+        eftElementtemplate = self._elementtemplates.get(id(eft))
+        if eftElementtemplate is None:
+            elementtemplate = self._mesh.createElementtemplate()
+            elementtemplate.setElementShapeType(self._shapeType)
+            result = elementtemplate.defineField(self._field, -1, eft)
+            assert result == 1, 'ElementtemplatePool.getElementtemplate:  Failed to define field'
+            eftElementtemplate = (eft, elementtemplate)
+            self._elementtemplates[id(eft)] = eftElementtemplate
+        return eftElementtemplate[1]
+
+    def getElementtemplatesCount(self):
+        '''
+        :return: Number of element templates created by pool.
+        '''
+        return len(self._elementtemplates)
@@ -5,7 +5,10 @@ Created on Apr 11, 2018
 @author: Richard Christie
 '''
 
+import bisect
+import functools
 import math
+from scaffoldmaker.utils.interpolation import gaussWt4, gaussXi4
 
 def getApproximateEllipsePerimeter(a, b):
     '''
@@ -17,52 +20,151 @@ def getApproximateEllipsePerimeter(a, b):
     h = ((a-b)/(a+b))**2
     return math.pi*(a + b)*(1.0 + 3.0*h/(10.0 + math.sqrt(4.0 - 3.0*h)))
 
+class EllipseArcTable:
+    '''
+    Table of cumulative arc length around ellipse x = a*cos(angle), y = b*sin(angle) at
+    regular angles, for fast evaluation of arc length between angles and its inverse.
+    '''
+
+    def __init__(self, a, b, intervalsCount = 256):
+        '''
+        :param a: Major axis length (On x, 0 / PI).
+        :param b: Minor axis length.(On y, PI/2, 3PI/2).
+        :param intervalsCount: Number of regular angle intervals around ellipse, each
+        integrated with 4 point Gaussian quadrature.
+        '''
+        self._a = a
+        self._b = b
+        self._intervalsCount = intervalsCount
+        self._intervalRadians = 2.0*math.pi/intervalsCount
+        self._cumulativeArcLengths = [ 0.0 ]
+        arcLength = 0.0
+        for i in range(intervalsCount):
+            arcLength += self._getIntervalArcLength(i*self._intervalRadians, (i + 1)*self._intervalRadians)
+            self._cumulativeArcLengths.append(arcLength)
+        self._perimeter = arcLength
+
+    def _getDerivativeMagnitude(self, angle):
+        '''
+        :return: Derivative of arc length w.r.t. angle.
+        '''
+        t0 = self._a*math.sin(angle)
+        t1 = self._b*math.cos(angle)
+        return math.sqrt(t0*t0 + t1*t1)
+
+    def _getIntervalArcLength(self, angle1, angle2):
+        '''
+        :return: Arc length from angle1 to angle2 by 4 point Gaussian quadrature.
+        '''
+        arcLength = 0.0
+        for i in range(4):
+            arcLength += gaussWt4[i]*self._getDerivativeMagnitude(angle1 + (angle2 - angle1)*gaussXi4[i])
+        return (angle2 - angle1)*arcLength
+
+    def getPerimeter(self):
+        return self._perimeter
+
+    def getArcLengthFromZero(self, angle):
+        '''
+        :param angle: Any angle anticlockwise from major axis, in radians.
+        :return: Arc length from angle 0, negative if angle is negative.
+        '''
+        turns = math.floor(angle/(2.0*math.pi))
+        localAngle = angle - turns*2.0*math.pi
+        i = min(int(localAngle/self._intervalRadians), self._intervalsCount - 1)
+        return turns*self._perimeter + self._cumulativeArcLengths[i] + \
+            self._getIntervalArcLength(i*self._intervalRadians, localAngle)
+
+    def getArcLength(self, angle1Radians, angle2Radians):
+        '''
+        :return: Perimeter length from angle1 to angle2, positive if anticlockwise, otherwise negative.
+        '''
+        return self.getArcLengthFromZero(angle2Radians) - self.getArcLengthFromZero(angle1Radians)
+
+    def getAngleFromZero(self, arcLength):
+        '''
+        Inverse of getArcLengthFromZero, found by binary search of table then Newton iteration.
+        :return: Angle in radians.
+        '''
+        turns = math.floor(arcLength/self._perimeter)
+        localArcLength = arcLength - turns*self._perimeter
+        i = min(max(bisect.bisect_right(self._cumulativeArcLengths, localArcLength) - 1, 0), self._intervalsCount - 1)
+        angle1 = i*self._intervalRadians
+        targetArcLength = localArcLength - self._cumulativeArcLengths[i]
+        intervalArcLength = self._cumulativeArcLengths[i + 1] - self._cumulativeArcLengths[i]
+        angle = angle1 + self._intervalRadians*targetArcLength/intervalArcLength
+        tolerance = 1.0E-12*self._perimeter
+        for iters in range(10):
+            f = self._getIntervalArcLength(angle1, angle) - targetArcLength
+            if math.fabs(f) < tolerance:
+                break
+            angle -= f/self._getDerivativeMagnitude(angle)
+        return turns*2.0*math.pi + angle
+
+    def updateAngleByArcLength(self, inAngleRadians, arcLength):
+        '''
+        :param inAngleRadians: Initial angle anticlockwise from major axis.
+        :param arcLength: Arc length to traverse. Positive=anticlockwise, negative=clockwise.
+        :return: New angle, in radians.
+        '''
+        return self.getAngleFromZero(self.getArcLengthFromZero(inAngleRadians) + arcLength)
+
+
+@functools.lru_cache(maxsize = 64)
+def getEllipseArcTable(a, b):
+    '''
+    Get EllipseArcTable for axis lengths a, b, caching the most recently used tables.
+    '''
+    return EllipseArcTable(a, b)
+
 def getEllipseArcLength(a, b, angle1Radians, angle2Radians):
     '''
-    Calculates perimeter distance between two angles by summing line segments at regular angles.
+    Calculates perimeter distance between two angles using a cached arc length table.
     :param a: Major axis length (On x, 0 / PI).
     :param b: Minor axis length.(On y, PI/2, 3PI/2).
     :param angle1Radians: First angle anticlockwise from major axis.
     :param angle2Radians: Second angle anticlockwise from major axis.
-    :return: Perimeter lenge, positive if anticlockwise, otherwise negative.
+    :return: Perimeter length, positive if anticlockwise, otherwise negative.
     '''
-    angle1 = min(angle1Radians, angle2Radians)
-    angle2 = max(angle1Radians, angle2Radians)
-    # Max 100 segments around ellipse
-    segmentCount = int(math.ceil(50*(angle2-angle1)/math.pi))
-    length = 0.0
-    for i in range(segmentCount + 1):
-        r = i/segmentCount
-        angle = r*angle1 + (1.0 - r)*angle2
-        x = ( a*math.cos(angle), b*math.sin(angle) )
-        if i > 0:
-            delta = math.sqrt((x[0] - lastX[0])*(x[0] - lastX[0]) + (x[1] - lastX[1])*(x[1] - lastX[1]))
-            length += delta
-        lastX = x
-    if angle1Radians < angle2Radians:
-        return length
-    else:
-        return -length
+    return getEllipseArcTable(a, b).getArcLength(angle1Radians, angle2Radians)
 
 def updateEllipseAngleByArcLength(a, b, inAngleRadians, arcLength):
     '''
     Update angle around ellipse to subtend arcLength around the perimeter.
-    Iterates using Newton's method.
+    Inverts a cached arc length table.
     :param inAngleRadians: Initial angle anticlockwise from major axis.
     :param arcLength: Arc length to traverse. Positive=anticlockwise, negative=clockwise.
     :param a: Major axis length (On x, 0 / PI).
     :param b: Minor axis length.(On y, PI/2, 3PI/2).
     :return: New angle, in radians.
     '''
-    angle = inAngleRadians
-    lengthMoved = 0.0
-    lengthTol = (a + b)*1.0E-4  # broader tolerance due to reliance on inexact getEllipseArcLength()
-    #print('inAngleRadians', inAngleRadians, ', arcLength', arcLength)
-    while math.fabs(arcLength - lengthMoved) > lengthTol:
-        t = ( -a*math.sin(angle), b*math.cos(angle) )
-        dlength_dangle = math.sqrt(t[0]*t[0] + t[1]*t[1])
-        angle += (arcLength - lengthMoved)/dlength_dangle
-        lengthMoved = getEllipseArcLength(a, b, inAngleRadians, angle)
-        #print('lengthMoved', lengthMoved)
-    #print('updateEllipseAngleByArcLength a', a, 'b', b, ', angle', inAngleRadians, ', arcLength', arcLength, ' -> ', angle)
-    return angle
+    return getEllipseArcTable(a, b).updateAngleByArcLength(inAngleRadians, arcLength)
+
+def getEllipsePointsAtArcLengths(a, b, startAngleRadians, segmentLengths):
+    '''
+    Get angles, points and unit tangents around ellipse from start angle, separated by
+    each of segmentLengths, all from one cached arc length table.
+    :param a: Major axis length (On x, 0 / PI).
+    :param b: Minor axis length.(On y, PI/2, 3PI/2).
+    :param startAngleRadians: Angle of first point anticlockwise from major axis.
+    :param segmentLengths: List of arc lengths between successive points. Positive=anticlockwise,
+    negative=clockwise.
+    :return: Lists of len(segmentLengths) + 1 angles, points [ x, y ], unit tangents [ dx, dy ]
+    in the anticlockwise direction.
+    '''
+    table = getEllipseArcTable(a, b)
+    arcLength = table.getArcLengthFromZero(startAngleRadians)
+    angles = [ startAngleRadians ]
+    for segmentLength in segmentLengths:
+        arcLength += segmentLength
+        angles.append(table.getAngleFromZero(arcLength))
+    points = []
+    tangents = []
+    for angle in angles:
+        cosAngle = math.cos(angle)
+        sinAngle = math.sin(angle)
+        points.append([ a*cosAngle, b*sinAngle ])
+        t = [ -a*sinAngle, b*cosAngle ]
+        mag = math.sqrt(t[0]*t[0] + t[1]*t[1])
+        tangents.append([ t[0]/mag, t[1]/mag ])
+    return angles, points, tangents
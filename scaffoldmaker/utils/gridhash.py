@@ -0,0 +1,129 @@
+'''
+Uniform grid hash for searching for objects by coordinates
+Created on Oct 17, 2026
+'''
+
+import math
+
+class GridHash:
+    '''
+    Uniform grid hash for searching for objects by coordinates within a fixed tolerance.
+    Objects are stored in a dict of cells keyed by quantised coordinates, giving expected
+    constant time find and add. Has the same interface as Octree.
+    '''
+
+    def __init__(self, minimums = None, maximums = None, tolerance = None, cellSize = None):
+        '''
+        :param minimums: List of 3 minimum coordinate values, or None. Only used to compute default tolerance.
+        :param maximums: List of 3 maximum coordinate values, or None. Only used to compute default tolerance.
+        :param tolerance: If supplied, tolerance to use, or None to compute as 1.0E-6*diagonal.
+        Must be supplied if bounds are not.
+        :param cellSize: If supplied, size of grid cells, or None to use 100*tolerance. Must be
+        at least 2*tolerance. Cells should be no bigger than the typical object spacing.
+        '''
+        self._dimension = 3
+        if tolerance is None:
+            assert (minimums is not None) and (maximums is not None), 'GridHash tolerance must be supplied if bounds are not'
+            assert len(minimums) == self._dimension, 'GridHash minimums is invalid length'
+            assert len(maximums) == self._dimension, 'GridHash maximums is invalid length'
+            self._tolerance = 1.0E-6*math.sqrt(sum(((maximums[i] - minimums[i])*(maximums[i] - minimums[i])) for i in range(self._dimension)))
+        else:
+            self._tolerance = tolerance
+        assert self._tolerance > 0.0, 'GridHash tolerance must be positive'
+        self._cellSize = (100.0*self._tolerance) if (cellSize is None) else cellSize
+        assert self._cellSize >= 2.0*self._tolerance, 'GridHash cellSize must be at least 2*tolerance'
+        # map from (i, j, k) cell index to list of (coordinates tuple, object)
+        self._cells = {}
+
+
+    def _findObjectByCoordinates(self, x):
+        '''
+        Find closest existing object with |x - ox| < tolerance.
+        :param x: 3 coordinates in a list.
+        :return: nearest distance, nearest object or None, None if none found.
+        '''
+        tolerance = self._tolerance
+        x1, x2, x3 = x[0], x[1], x[2]
+        nearestDistance = None
+        nearestObject = None
+        # get range of cells within tolerance of x, usually just one
+        scale = 1.0/self._cellSize
+        floor = math.floor
+        i1, i2 = floor((x1 - tolerance)*scale), floor((x1 + tolerance)*scale)
+        j1, j2 = floor((x2 - tolerance)*scale), floor((x2 + tolerance)*scale)
+        k1, k2 = floor((x3 - tolerance)*scale), floor((x3 + tolerance)*scale)
+        if (i1 == i2) and (j1 == j2) and (k1 == k2):
+            cellKeys = ((i1, j1, k1),)
+        else:
+            cellKeys = [ (i, j, k) for k in range(k1, k2 + 1) for j in range(j1, j2 + 1) for i in range(i1, i2 + 1) ]
+        for cellKey in cellKeys:
+            coordinatesObjects = self._cells.get(cellKey)
+            if coordinatesObjects is None:
+                continue
+            for ox, obj in coordinatesObjects:
+                # cheaply determine if in 2*tolerance sized box around object
+                dx1 = x1 - ox[0]
+                if (dx1 > tolerance) or (dx1 < -tolerance):
+                    continue
+                dx2 = x2 - ox[1]
+                if (dx2 > tolerance) or (dx2 < -tolerance):
+                    continue
+                dx3 = x3 - ox[2]
+                if (dx3 > tolerance) or (dx3 < -tolerance):
+                    continue
+                # now test exact distance
+                distance = math.sqrt(dx1*dx1 + dx2*dx2 + dx3*dx3)
+                if (distance < tolerance) and ((nearestDistance is None) or (distance < nearestDistance)):
+                    nearestDistance = distance
+                    nearestObject = obj
+        return nearestDistance, nearestObject
+
+
+    def findObjectByCoordinates(self, x):
+        '''
+        Find closest existing object with |x - ox| < tolerance.
+        :param x: 3 coordinates in a list.
+        :return: nearest object or None if not found.
+        '''
+        nearestDistance, nearestObject = self._findObjectByCoordinates(x)
+        return nearestObject
+
+
+    def addObjectAtCoordinates(self, x, obj):
+        '''
+        Add object at coordinates to grid hash.
+        Caller must have received None result for findObjectByCoordinates() first!
+        :param x: 3 coordinates in a list.
+        :param obj: object to store with coordinates.
+        '''
+        scale = 1.0/self._cellSize
+        cellKey = (math.floor(x[0]*scale), math.floor(x[1]*scale), math.floor(x[2]*scale))
+        coordinatesObject = ((x[0], x[1], x[2]), obj)
+        coordinatesObjects = self._cells.get(cellKey)
+        if coordinatesObjects is None:
+            self._cells[cellKey] = [ coordinatesObject ]
+        else:
+            coordinatesObjects.append(coordinatesObject)
+
+
+    def findObjectsByCoordinates(self, xList):
+        '''
+        Find closest existing object within tolerance of each of xList.
+        :param xList: List of coordinates, each a list of 3 values.
+        :return: List of nearest object or None if not found, for each of xList.
+        '''
+        findObject = self._findObjectByCoordinates
+        return [ findObject(x)[1] for x in xList ]
+
+
+    def addObjectsAtCoordinates(self, xList, objs):
+        '''
+        Add objects at respective coordinates to grid hash.
+        Caller must have received None result for each of xList from findObjectsByCoordinates() first!
+        :param xList: List of coordinates, each a list of 3 values.
+        :param objs: List of objects to store with coordinates, same length as xList.
+        '''
+        assert len(xList) == len(objs), 'GridHash addObjectsAtCoordinates lists have different lengths'
+        addObject = self.addObjectAtCoordinates
+        for x, obj in zip(xList, objs):
+            addObject(x, obj)
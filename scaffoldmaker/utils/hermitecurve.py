@@ -0,0 +1,136 @@
+'''
+Class for sampling a chain of cubic Hermite segments by arc length.
+Created on Oct 17, 2026
+'''
+
+import bisect
+import math
+from scaffoldmaker.utils.interpolation import gaussWt4, gaussXi4, getCubicHermiteBasis, getCubicHermiteBasisDerivatives
+
+class HermiteCurve:
+    '''
+    Chain of cubic Hermite segments between successive nodes, with a table of cumulative
+    arc length precomputed at regular xi intervals in each element so points can be found
+    at any arc length by binary search and a few Newton iterations.
+    '''
+
+    def __init__(self, nx, nd, samplesPerElement = 8):
+        '''
+        :param nx: List of node coordinates, at least 2.
+        :param nd: List of node derivatives, same length as nx. Element e interpolates
+        nx[e], nd[e], nx[e + 1], nd[e + 1].
+        :param samplesPerElement: Number of xi intervals to tabulate arc length over in each
+        element. More samples makes inverse lookup start closer to the solution.
+        '''
+        assert len(nx) >= 2, 'HermiteCurve needs at least 2 nodes'
+        assert len(nx) == len(nd), 'HermiteCurve nx and nd have different lengths'
+        assert samplesPerElement > 0, 'HermiteCurve samplesPerElement must be positive'
+        self._nx = [ list(x) for x in nx ]
+        self._nd = [ list(d) for d in nd ]
+        self._componentsCount = len(nx[0])
+        self._elementsCount = len(nx) - 1
+        self._samplesPerElement = samplesPerElement
+        # cumulative arc length at xi = k/samplesPerElement in each element, ending with total
+        self._cumulativeArcLengths = [ 0.0 ]
+        arcLength = 0.0
+        for e in range(self._elementsCount):
+            for k in range(samplesPerElement):
+                arcLength += self._getElementArcLength(e, k/samplesPerElement, (k + 1)/samplesPerElement)
+                self._cumulativeArcLengths.append(arcLength)
+
+    def _getElementDerivative(self, e, xi):
+        '''
+        :return: Derivative w.r.t. xi of element e at xi.
+        '''
+        df1, df2, df3, df4 = getCubicHermiteBasisDerivatives(xi)
+        v1, d1, v2, d2 = self._nx[e], self._nd[e], self._nx[e + 1], self._nd[e + 1]
+        return [ (df1*v1[c] + df2*d1[c] + df3*v2[c] + df4*d2[c]) for c in range(self._componentsCount) ]
+
+    def _getElementArcLength(self, e, xi0, xi1):
+        '''
+        :return: Arc length of element e from xi0 to xi1 by 4 point Gaussian quadrature.
+        '''
+        arcLength = 0.0
+        for i in range(4):
+            d = self._getElementDerivative(e, xi0 + (xi1 - xi0)*gaussXi4[i])
+            arcLength += gaussWt4[i]*math.sqrt(sum(v*v for v in d))
+        return (xi1 - xi0)*arcLength
+
+    def getArcLength(self):
+        '''
+        :return: Total arc length of curve.
+        '''
+        return self._cumulativeArcLengths[-1]
+
+    def getElementsCount(self):
+        return self._elementsCount
+
+    def getLocation(self, arcLength):
+        '''
+        Get element location at arc length along curve. Arc lengths outside the range of
+        the curve are clamped to its ends.
+        :return: element index, xi
+        '''
+        if arcLength <= 0.0:
+            return 0, 0.0
+        if arcLength >= self._cumulativeArcLengths[-1]:
+            return self._elementsCount - 1, 1.0
+        j = bisect.bisect_right(self._cumulativeArcLengths, arcLength) - 1
+        e = j // self._samplesPerElement
+        xiSize = 1.0/self._samplesPerElement
+        xi0 = (j % self._samplesPerElement)*xiSize
+        sampleArcLength = self._cumulativeArcLengths[j + 1] - self._cumulativeArcLengths[j]
+        targetArcLength = arcLength - self._cumulativeArcLengths[j]
+        if sampleArcLength <= 0.0:
+            return e, xi0
+        tolerance = 1.0E-12*self._cumulativeArcLengths[-1]
+        # Newton iteration for xi giving target arc length from xi0, within sample interval
+        xi = xi0 + xiSize*targetArcLength/sampleArcLength
+        for iters in range(10):
+            f = self._getElementArcLength(e, xi0, xi) - targetArcLength
+            if math.fabs(f) < tolerance:
+                break
+            d = self._getElementDerivative(e, xi)
+            df = math.sqrt(sum(v*v for v in d))
+            if df <= 0.0:
+                break
+            xi = min(max(xi - f/df, xi0), xi0 + xiSize)
+        return e, xi
+
+    def evaluate(self, e, xi):
+        '''
+        :return: Coordinates, derivative w.r.t. xi of element e at xi.
+        '''
+        f1, f2, f3, f4 = getCubicHermiteBasis(xi)
+        v1, d1, v2, d2 = self._nx[e], self._nd[e], self._nx[e + 1], self._nd[e + 1]
+        x = [ (f1*v1[c] + f2*d1[c] + f3*v2[c] + f4*d2[c]) for c in range(self._componentsCount) ]
+        return x, self._getElementDerivative(e, xi)
+
+    def getPointsAtArcLengths(self, arcLengths, derivativeMagnitude = 1.0):
+        '''
+        Get coordinates and derivatives at each of arcLengths along curve.
+        :param arcLengths: List of arc lengths from start of curve.
+        :param derivativeMagnitude: Magnitude to scale derivatives to. Default 1.0 gives unit
+        tangents i.e. derivatives w.r.t. arc length.
+        :return: list of coordinates, list of derivatives
+        '''
+        px = []
+        pd = []
+        for arcLength in arcLengths:
+            e, xi = self.getLocation(arcLength)
+            x, d = self.evaluate(e, xi)
+            mag = math.sqrt(sum(v*v for v in d))
+            scale = (derivativeMagnitude/mag) if (mag > 0.0) else 0.0
+            px.append(x)
+            pd.append([ v*scale for v in d ])
+        return px, pd
+
+    def getEquallySpacedPoints(self, elementsCount):
+        '''
+        Get points dividing curve into elementsCount pieces of equal arc length, with
+        derivatives scaled to the arc length spacing.
+        :return: list of elementsCount + 1 coordinates, list of derivatives
+        '''
+        assert elementsCount > 0, 'HermiteCurve getEquallySpacedPoints elementsCount must be positive'
+        spacing = self.getArcLength()/elementsCount
+        return self.getPointsAtArcLengths([ n*spacing for n in range(elementsCount + 1) ], spacing)
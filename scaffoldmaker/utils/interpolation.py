@@ -11,6 +11,67 @@ import scaffoldmaker.utils.vector as vector
 gaussXi3 = ( (-math.sqrt(0.6)+1.0)/2.0, 0.5, (+math.sqrt(0.6)+1.0)/2.0 )
 gaussWt3 = ( 5.0/18.0, 4.0/9.0, 5.0/18.0 )
 
+def getCubicHermiteBasis(xi):
+    """
+    Get the 4 cubic Hermite basis functions at xi in [0,1], multiplying v1, d1, v2, d2.
+    :return: tuple(f1, f2, f3, f4)
+    """
+    xi2 = xi*xi
+    xi3 = xi2*xi
+    return ( 1.0 - 3.0*xi2 + 2.0*xi3, xi - 2.0*xi2 + xi3, 3.0*xi2 - 2.0*xi3, -xi2 + xi3 )
+
+def getCubicHermiteBasisDerivatives(xi):
+    """
+    Get the first derivatives of the 4 cubic Hermite basis functions at xi in [0,1].
+    :return: tuple(df1, df2, df3, df4)
+    """
+    xi2 = xi*xi
+    return ( -6.0*xi + 6.0*xi2, 1.0 - 4.0*xi + 3.0*xi2, 6.0*xi - 6.0*xi2, -2.0*xi + 3.0*xi2 )
+
+def getCubicHermiteBasisSecondDerivatives(xi):
+    """
+    Get the second derivatives of the 4 cubic Hermite basis functions at xi in [0,1].
+    :return: tuple(d2f1, d2f2, d2f3, d2f4)
+    """
+    return ( -6.0 + 12.0*xi, -4.0 + 6.0*xi, 6.0 - 12.0*xi, -2.0 + 6.0*xi )
+
+def _interpolateCubicHermiteBasisList(v1List, d1List, v2List, d2List, basisList):
+    """
+    Sum cubic Hermite curve parameters weighted by each of a list of basis function values.
+    :param basisList: List of tuple(f1, f2, f3, f4) to evaluate with.
+    :return: list over curves of list over basisList of tuple containing result
+    """
+    assert len(v1List) == len(d1List) == len(v2List) == len(d2List), 'Cubic Hermite curve lists have different lengths'
+    result = []
+    for v1, d1, v2, d2 in zip(v1List, d1List, v2List, d2List):
+        components = range(len(v1))
+        result.append([ tuple([ (f1*v1[i] + f2*d1[i] + f3*v2[i] + f4*d2[i]) for i in components ]) for f1, f2, f3, f4 in basisList ])
+    return result
+
+def interpolateCubicHermiteList(v1List, d1List, v2List, d2List, xiList):
+    """
+    Batch version of interpolateCubicHermite for many curves and xi values, computing basis
+    functions once for each xi.
+    :param v1List, d1List, v2List, d2List: Lists of parameters for each curve.
+    :param xiList: List of xi in [0,1] to evaluate all curves at.
+    :return: list over curves of list over xiList of tuple containing result
+    """
+    return _interpolateCubicHermiteBasisList(v1List, d1List, v2List, d2List, [ getCubicHermiteBasis(xi) for xi in xiList ])
+
+def interpolateCubicHermiteDerivativeList(v1List, d1List, v2List, d2List, xiList):
+    """
+    Batch version of interpolateCubicHermiteDerivative. See interpolateCubicHermiteList.
+    :return: list over curves of list over xiList of tuple containing result
+    """
+    return _interpolateCubicHermiteBasisList(v1List, d1List, v2List, d2List, [ getCubicHermiteBasisDerivatives(xi) for xi in xiList ])
+
+def interpolateCubicHermiteSecondDerivativeList(v1List, d1List, v2List, d2List, xiList):
+    """
+    Batch version of interpolateCubicHermiteSecondDerivative. See interpolateCubicHermiteList.
+    :return: list over curves of list over xiList of tuple containing result
+    """
+    return _interpolateCubicHermiteBasisList(v1List, d1List, v2List, d2List, [ getCubicHermiteBasisSecondDerivatives(xi) for xi in xiList ])
+
 def interpolateCubicHermite(v1, d1, v2, d2, xi):
     """
     Return cubic Hermite interpolated value of tuples v1, d1 (end 1) to v2, d2 (end 2) for xi in [0,1]
@@ -47,36 +108,144 @@ def interpolateCubicHermiteSecondDerivative(v1, d1, v2, d2, xi):
     f4 = -2.0 +  6.0*xi
     return tuple([ (f1*v1[i] + f2*d1[i] + f3*v2[i] + f4*d2[i]) for i in range(len(v1)) ])
 
-def computeCubicHermiteArcLength(v1, d1, v2, d2, rescaleDerivatives):
+gaussXi4 = ( (1.0 - math.sqrt(3.0/7.0 + 2.0/7.0*math.sqrt(1.2)))/2.0, (1.0 - math.sqrt(3.0/7.0 - 2.0/7.0*math.sqrt(1.2)))/2.0,
+              (1.0 + math.sqrt(3.0/7.0 - 2.0/7.0*math.sqrt(1.2)))/2.0, (1.0 + math.sqrt(3.0/7.0 + 2.0/7.0*math.sqrt(1.2)))/2.0 )
+gaussWt4 = ( (18.0 - math.sqrt(30.0))/72.0, (18.0 + math.sqrt(30.0))/72.0, (18.0 + math.sqrt(30.0))/72.0, (18.0 - math.sqrt(30.0))/72.0 )
+
+def _getCubicHermiteArcLengthAndDerivative(a, d1, d2, arcLength, tolerance):
     """
-    Compute arc length between v1 and v2, scaling unit d1 and d2.
-    Iterative; not optimised.
+    Integrate arc length of cubic Hermite curve from v1 to v2 with derivatives arcLength*d1 and
+    arcLength*d2, and its derivative w.r.t. arcLength, by adaptive 4 point Gauss-Legendre quadrature.
+    :param a: v1 - v2.
+    :param d1, d2: Unit derivatives at v1 and v2.
+    :param tolerance: Absolute tolerance on integrated arc length.
+    :return: Integrated arc length, derivative of integrated arc length w.r.t. arcLength.
+    """
+    components = range(len(a))
+    def integrate(xi0, xi1):
+        length = 0.0
+        dlength = 0.0
+        dxi = xi1 - xi0
+        for i in range(4):
+            xi = xi0 + dxi*gaussXi4[i]
+            xi2 = xi*xi
+            # curve derivative is fa*a + arcLength*b
+            fa = -6.0*xi + 6.0*xi2
+            f1 = 1.0 - 4.0*xi + 3.0*xi2
+            f2 = -2.0*xi + 3.0*xi2
+            mag2 = 0.0
+            dmag2 = 0.0
+            for c in components:
+                b = f1*d1[c] + f2*d2[c]
+                d = fa*a[c] + arcLength*b
+                mag2 += d*d
+                dmag2 += d*b
+            if mag2 > 0.0:
+                mag = math.sqrt(mag2)
+                length += gaussWt4[i]*mag
+                dlength += gaussWt4[i]*dmag2/mag
+        return dxi*length, dxi*dlength
+    totalLength = 0.0
+    totalDlength = 0.0
+    # stack of intervals to subdivide with their whole interval estimates and tolerances
+    # start from several intervals so a narrow dip in speed can't be missed by the whole
+    # and half interval estimates agreeing by chance
+    intervalsCount = 8
+    dxi = 1.0/intervalsCount
+    intervalTolerance = tolerance*dxi
+    intervals = []
+    for e in range(intervalsCount - 1, -1, -1):
+        xi0 = e*dxi
+        xi1 = (e + 1)*dxi
+        intervals.append((xi0, xi1, integrate(xi0, xi1), intervalTolerance))
+    while intervals:
+        xi0, xi1, whole, intervalTolerance = intervals.pop()
+        xim = 0.5*(xi0 + xi1)
+        left = integrate(xi0, xim)
+        right = integrate(xim, xi1)
+        # error of 4 point rule is O(h^8) so error of halves is estimated as their difference from whole / 255
+        # derivative is also checked as it changes sharply where speed is near zero, and relative to
+        # arcLength it has the same tolerance; minimum width only guards against endless subdivision
+        if (((math.fabs(left[0] + right[0] - whole[0]) <= 255.0*intervalTolerance) and
+                (math.fabs(left[1] + right[1] - whole[1])*arcLength <= 255.0*intervalTolerance)) or
+                ((xi1 - xi0) < 1.0E-9)):
+            totalLength += left[0] + right[0]
+            totalDlength += left[1] + right[1]
+        else:
+            intervals.append((xim, xi1, right, 0.5*intervalTolerance))
+            intervals.append((xi0, xim, left, 0.5*intervalTolerance))
+    return totalLength, totalDlength
+
+def solveCubicHermiteArcLength(v1, d1, v2, d2, rescaleDerivatives, tolerance = 1.0E-6):
+    """
+    Compute arc length between v1 and v2 for which the cubic Hermite curve with derivatives
+    in the directions of d1 and d2 scaled to that arc length has the same arc length.
+    Solved by Newton iteration with arc length integrated by adaptive Gauss-Legendre quadrature.
     :param d1: Initial derivative at v1.
     :param d2: Initial derivative at v2.
-    :param rescaleDerivatives: If True, rescale initial d1 and d2 to |v2 - v|
-    :return: Arc length.
+    :param rescaleDerivatives: If True, start from |v2 - v1|, otherwise from the arc length
+    with d1 and d2 as supplied.
+    :param tolerance: Relative tolerance on arc length.
+    :return: Arc length, number of iterations which is the maximum of 20 if not converged.
     """
     if rescaleDerivatives:
-        lastArcLength = math.sqrt(sum((v2[i] - v1[i])*(v2[i] - v1[i]) for i in range(len(v1))))
+        arcLength = math.sqrt(sum((v2[i] - v1[i])*(v2[i] - v1[i]) for i in range(len(v1))))
     else:
-        lastArcLength = getCubicHermiteArcLength(v1, d1, v2, d2)
+        arcLength = getCubicHermiteArcLength(v1, d1, v2, d2)
     d1 = vector.normalise(d1)
     d2 = vector.normalise(d2)
-    tol = 1.0E-6
-    for iters in range(100):
-        #print('iter',iters,'=',lastArcLength)
-        d1s = [lastArcLength*d for d in d1]
-        d2s = [lastArcLength*d for d in d2]
-        arcLength = getCubicHermiteArcLength(v1, d1s, v2, d2s)
-        if iters > 9:
-            arcLength = 0.8*arcLength + 0.2*lastArcLength
-        if math.fabs(arcLength - lastArcLength) < tol*arcLength:
-            #print('computeCubicHermiteArcLength converged at iter',iters,'=',arcLength,', closeness', math.fabs(arcLength - lastArcLength))
-            return arcLength
-        lastArcLength = arcLength
-    print('computeCubicHermiteArcLength Max iters reached:',iters,'=',arcLength,', closeness', math.fabs(arcLength - lastArcLength))
+    a = [ (v1[c] - v2[c]) for c in range(len(v1)) ]
+    # integrate loosely until close to solution, then with a fixed tight tolerance so the
+    # function being solved does not change between iterations
+    looseIntegrationTolerance = 1.0E-3
+    tightIntegrationTolerance = 0.01*tolerance
+    integrationTolerance = looseIntegrationTolerance
+    maxIters = 20
+    for iters in range(1, maxIters + 1):
+        if arcLength <= 0.0:
+            return 0.0, iters
+        curveArcLength, dCurveArcLength = _getCubicHermiteArcLengthAndDerivative(a, d1, d2, arcLength, integrationTolerance*arcLength)
+        # Newton step on f(arcLength) = curveArcLength(arcLength) - arcLength
+        df = dCurveArcLength - 1.0
+        if df < -0.1:
+            newArcLength = arcLength - (curveArcLength - arcLength)/df
+        else:
+            # rare: fall back to fixed point step
+            newArcLength = curveArcLength
+        if newArcLength <= 0.0:
+            newArcLength = 0.5*arcLength
+        change = math.fabs(newArcLength - arcLength)
+        if integrationTolerance == tightIntegrationTolerance:
+            if change < tolerance*newArcLength:
+                return newArcLength, iters
+        elif change < 10.0*looseIntegrationTolerance*newArcLength:
+            integrationTolerance = tightIntegrationTolerance
+        arcLength = newArcLength
+    return arcLength, maxIters
+
+def computeCubicHermiteArcLength(v1, d1, v2, d2, rescaleDerivatives):
+    """
+    Compute arc length between v1 and v2, scaling unit d1 and d2.
+    See solveCubicHermiteArcLength.
+    :param d1: Initial derivative at v1.
+    :param d2: Initial derivative at v2.
+    :param rescaleDerivatives: If True, rescale initial d1 and d2 to |v2 - v|
+    :return: Arc length.
+    """
+    arcLength, iters = solveCubicHermiteArcLength(v1, d1, v2, d2, rescaleDerivatives)
     return arcLength
 
+def computeCubicHermiteArcLengthList(v1List, d1List, v2List, d2List, rescaleDerivatives, tolerance = 1.0E-6):
+    """
+    Batch version of computeCubicHermiteArcLength for many curves.
+    See solveCubicHermiteArcLength.
+    :param v1List, d1List, v2List, d2List: Lists of parameters for each curve.
+    :return: List of arc lengths.
+    """
+    assert len(v1List) == len(d1List) == len(v2List) == len(d2List), 'Cubic Hermite curve lists have different lengths'
+    return [ solveCubicHermiteArcLength(v1, d1, v2, d2, rescaleDerivatives, tolerance)[0] \
+        for v1, d1, v2, d2 in zip(v1List, d1List, v2List, d2List) ]
+
 def getCubicHermiteArcLength(v1, d1, v2, d2):
     '''
     :return: Arc length of cubic curve using 3 point Gaussian quadrature.
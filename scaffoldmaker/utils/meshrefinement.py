@@ -6,49 +6,325 @@ Created on April 4, 2018
 '''
 
 from scaffoldmaker.annotation.annotationgroup import AnnotationGroup
+from scaffoldmaker.utils.eft_utils import getEftTermScaling
+from scaffoldmaker.utils.eftfactory_tricubichermite import eftfactory_tricubichermite
+from scaffoldmaker.utils.elementparameters import ElementParameters
+from scaffoldmaker.utils.elementtemplatepool import ElementtemplatePool
+from scaffoldmaker.utils.gridhash import GridHash
+from scaffoldmaker.utils.interpolation import getCubicHermiteBasis, getCubicHermiteBasisDerivatives
 from scaffoldmaker.utils.octree import Octree
 from scaffoldmaker.utils.zinc_utils import *
-from opencmiss.zinc.element import Element, Elementbasis
+import math
+from opencmiss.zinc.element import Element, Elementbasis, Elementfieldtemplate
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.node import Node
 from opencmiss.zinc.result import RESULT_OK as ZINC_OK
 
+def _evaluateLatticeCoordinates(cache, coordinates, element, latticeXi, derivativeScales = None):
+    '''
+    Evaluate coordinates at each of latticeXi in element.
+    :param derivativeScales: Optional list of 3 scales to multiply derivatives w.r.t. xi1, xi2
+    and xi3 by, e.g. the refined element size in xi. If None, derivatives are not evaluated.
+    :return: List of coordinates for latticeXi, list of [ d1, d2, d3 ] scaled derivatives
+    for latticeXi or None if not evaluated.
+    '''
+    setMeshLocation = cache.setMeshLocation
+    evaluateReal = coordinates.evaluateReal
+    latticeX = []
+    if derivativeScales is None:
+        for xi in latticeXi:
+            setMeshLocation(element, xi)
+            result, x = evaluateReal(cache, 3)
+            latticeX.append(x)
+        return latticeX, None
+    mesh = element.getMesh()
+    evaluateDerivative = coordinates.evaluateDerivative
+    derivativeOperatorsScales = [ (mesh.getChartDifferentialoperator(1, i + 1), derivativeScales[i]) for i in range(3) ]
+    latticeD = []
+    for xi in latticeXi:
+        setMeshLocation(element, xi)
+        result, x = evaluateReal(cache, 3)
+        latticeX.append(x)
+        d = []
+        for derivativeOperator, scale in derivativeOperatorsScales:
+            result, dx_dxi = evaluateDerivative(derivativeOperator, cache, 3)
+            d.append([ scale*v for v in dx_dxi ])
+        latticeD.append(d)
+    return latticeX, latticeD
+
+# below this number of field evaluations per element it is quicker to evaluate with Zinc
+_basisTableMinimumEvaluations = 1000
+
+def _getElementBasisParameters(elementParameters, element):
+    '''
+    Get the parameters multiplying each basis function of coordinates in element.
+    Only tensor products of cubic Hermite and linear Lagrange bases are supported.
+    :param elementParameters: ElementParameters for source coordinates.
+    :return: Tuple of basis function types in xi1, xi2, xi3, list of parameters for each
+    basis function in Zinc order; or None, None if not supported.
+    '''
+    termsMap, eft = elementParameters.getElementTermsMap(element)
+    if termsMap is None:
+        return None, None
+    functionTypes, localNodesCount, functionsTerms = termsMap
+    functionsCount = 8
+    for functionType in functionTypes:
+        if functionType == Elementbasis.FUNCTION_TYPE_CUBIC_HERMITE:
+            functionsCount *= 2
+        elif functionType != Elementbasis.FUNCTION_TYPE_LINEAR_LAGRANGE:
+            return None, None
+    if len(functionsTerms) != functionsCount:
+        return None, None
+    return elementParameters.getElementParameters(element, termsMap, eft)
+
+def _getLatticeBasisTable(functionTypes, numbersInXi, basisTables):
+    '''
+    Get tensor product basis weights for a regular lattice, computed once for
+    each distinct basis function types and numbers in xi and stored in basisTables.
+    :param basisTables: Dict to cache results in.
+    :return: dict with 'counts': number of 1-D basis functions in each xi direction,
+    'indexes': tensor index of each Zinc basis function,
+    'weights', 'derivativeWeights': for each xi direction, list over lattice index of 1-D weights.
+    '''
+    key = (functionTypes, tuple(numbersInXi))
+    basisTable = basisTables.get(key)
+    if basisTable is not None:
+        return basisTable
+    hermite = [ (functionType == Elementbasis.FUNCTION_TYPE_CUBIC_HERMITE) for functionType in functionTypes ]
+    counts = [ (4 if hermite[c] else 2) for c in range(3) ]
+    functionsCountPerNode = (counts[0]*counts[1]*counts[2]) // 8
+    indexes = []
+    for f in range(8*functionsCountPerNode):
+        n = f // functionsCountPerNode
+        m = f % functionsCountPerNode
+        h = 0
+        a = [ 0, 0, 0 ]
+        for c in range(3):
+            nodeBit = (n >> c) & 1
+            if hermite[c]:
+                # 1-D cubic Hermite order: value, derivative at xi = 0, then xi = 1
+                a[c] = nodeBit*2 + ((m >> h) & 1)
+                h += 1
+            else:
+                a[c] = nodeBit
+        indexes.append((a[2]*counts[1] + a[1])*counts[0] + a[0])
+    weights = []
+    derivativeWeights = []
+    for c in range(3):
+        xis = [ i/numbersInXi[c] for i in range(numbersInXi[c] + 1) ]
+        if hermite[c]:
+            weights.append([ getCubicHermiteBasis(xi) for xi in xis ])
+            derivativeWeights.append([ getCubicHermiteBasisDerivatives(xi) for xi in xis ])
+        else:
+            weights.append([ (1.0 - xi, xi) for xi in xis ])
+            derivativeWeights.append([ (-1.0, 1.0) for xi in xis ])
+    basisTable = { 'counts' : counts, 'indexes' : indexes, 'weights' : weights, 'derivativeWeights' : derivativeWeights }
+    basisTables[key] = basisTable
+    return basisTable
+
+def _evaluateTensorProductLattice(tensorParameters, counts, weights1, weights2, weights3, scale = 1.0):
+    '''
+    Evaluate tensor product basis over lattice by sum factorisation, contracting with
+    the 1-D weights in xi3, then xi2, then xi1.
+    :param tensorParameters: List of 3-component parameters indexed by (a3*counts[1] + a2)*counts[0] + a1.
+    :param counts: Number of 1-D basis functions in each xi direction.
+    :param weights1, weights2, weights3: For each xi direction, list over lattice index of 1-D weights.
+    :param scale: Factor to multiply all results by.
+    :return: List of results varying fastest in xi1, then xi2, then xi3.
+    '''
+    count1, count2, count3 = counts
+    count12 = count1*count2
+    latticeValues = []
+    for w3 in weights3:
+        t1 = []
+        for a in range(count12):
+            x = y = z = 0.0
+            for a3 in range(count3):
+                w = w3[a3]
+                p = tensorParameters[a3*count12 + a]
+                x += w*p[0]
+                y += w*p[1]
+                z += w*p[2]
+            t1.append((x, y, z))
+        for w2 in weights2:
+            t2 = []
+            for a1 in range(count1):
+                x = y = z = 0.0
+                for a2 in range(count2):
+                    w = scale*w2[a2]
+                    p = t1[a2*count1 + a1]
+                    x += w*p[0]
+                    y += w*p[1]
+                    z += w*p[2]
+                t2.extend((x, y, z))
+            # innermost contraction is unrolled as it is done for every lattice point
+            if count1 == 4:
+                x0, y0, z0, x1, y1, z1, x2, y2, z2, x3, y3, z3 = t2
+                for w0, w1, w2, w3 in weights1:
+                    latticeValues.append([ w0*x0 + w1*x1 + w2*x2 + w3*x3, w0*y0 + w1*y1 + w2*y2 + w3*y3, w0*z0 + w1*z1 + w2*z2 + w3*z3 ])
+            else:
+                x0, y0, z0, x1, y1, z1 = t2
+                for w0, w1 in weights1:
+                    latticeValues.append([ w0*x0 + w1*x1, w0*y0 + w1*y1, w0*z0 + w1*z1 ])
+    return latticeValues
+
+def _evaluateLatticeParameters(cache, coordinates, element, numbersInXi, latticeXi, derivativeScales, basisTables, elementParameters):
+    '''
+    Evaluate coordinates and optional scaled derivatives over lattice in element.
+    For large lattices in supported bases, the element basis parameters are obtained once
+    and multiplied by basis weights precomputed for the lattice, otherwise the field is
+    evaluated at each point.
+    :param numbersInXi: Numbers of lattice elements in xi1, xi2, xi3.
+    :param latticeXi: Lattice xi from MeshRefinement._getLatticeXi().
+    :param basisTables: Dict caching basis weights, see _getLatticeBasisTable().
+    :param elementParameters: ElementParameters for coordinates.
+    :return: latticeX, latticeD. See _evaluateLatticeCoordinates().
+    '''
+    evaluationsCount = len(latticeXi)*(1 if (derivativeScales is None) else 4)
+    if evaluationsCount < _basisTableMinimumEvaluations:
+        return _evaluateLatticeCoordinates(cache, coordinates, element, latticeXi, derivativeScales)
+    functionTypes, parameters = _getElementBasisParameters(elementParameters, element)
+    if parameters is None:
+        return _evaluateLatticeCoordinates(cache, coordinates, element, latticeXi, derivativeScales)
+    basisTable = _getLatticeBasisTable(functionTypes, numbersInXi, basisTables)
+    counts = basisTable['counts']
+    tensorParameters = [ None ]*len(parameters)
+    for f, index in enumerate(basisTable['indexes']):
+        tensorParameters[index] = parameters[f]
+    weights = basisTable['weights']
+    latticeX = _evaluateTensorProductLattice(tensorParameters, counts, weights[0], weights[1], weights[2])
+    if derivativeScales is None:
+        return latticeX, None
+    derivativeWeights = basisTable['derivativeWeights']
+    latticeDs = [ _evaluateTensorProductLattice(tensorParameters, counts,
+        *[ (derivativeWeights[c] if (c == d) else weights[c]) for c in range(3) ], scale = derivativeScales[d]) for d in range(3) ]
+    latticeD = [ list(d) for d in zip(*latticeDs) ]
+    return latticeX, latticeD
+
+def _getElementCornerNodeIdentifiers(coordinates, element):
+    '''
+    Get identifiers of nodes at the 8 corners of element.
+    :return: List of 8 node identifiers varying fastest in xi1, then xi2, then xi3,
+    or None if any corner value is not mapped directly from a distinct node, e.g.
+    collapsed apex elements and hanging nodes.
+    '''
+    eft = element.getElementfieldtemplate(coordinates, -1)
+    functionsCountPerBasisNode = eft.getNumberOfFunctions()//8
+    nodeIds = []
+    for n in range(8):
+        f = n*functionsCountPerBasisNode + 1
+        if (eft.getFunctionNumberOfTerms(f) != 1) or \
+            (eft.getTermNodeValueLabel(f, 1) != Node.VALUE_LABEL_VALUE) or \
+            (eft.getTermNodeVersion(f, 1) != 1) or getEftTermScaling(eft, f, 1):
+            return None
+        node = element.getNode(eft, eft.getTermLocalNodeIndex(f, 1))
+        nodeIds.append(node.getIdentifier())
+    if len(set(nodeIds)) < 8:
+        return None
+    return nodeIds
+
+def _getLatticeTopologyKeys(cornerNodeIds, numberInXi1, numberInXi2, numberInXi3):
+    '''
+    Get keys identifying lattice points by source topology, independent of the
+    orientation of the element sharing them:
+    corner: (nodeId, )
+    edge: (nodeId1, nodeId2, index from nodeId1) with nodeId1 < nodeId2
+    face: (nodeId1, nodeId2, nodeId3, index towards nodeId2, index towards nodeId3)
+    where nodeId1 is the lowest on the face and nodeId2 < nodeId3 are adjacent to it.
+    :param cornerNodeIds: 8 node identifiers from _getElementCornerNodeIdentifiers().
+    :return: List of keys over lattice in order of MeshRefinement.evaluateElementLatticeCoordinates(),
+    with None for interior points which are never shared.
+    '''
+    numbersInXi = [ numberInXi1, numberInXi2, numberInXi3 ]
+    keys = []
+    index = [ 0, 0, 0 ]
+    for k in range(numberInXi3 + 1):
+        index[2] = k
+        for j in range(numberInXi2 + 1):
+            index[1] = j
+            for i in range(numberInXi1 + 1):
+                index[0] = i
+                freeAxes = []
+                cornerBits = 0
+                for c in range(3):
+                    if index[c] == numbersInXi[c]:
+                        cornerBits += 1 << c
+                    elif index[c] > 0:
+                        freeAxes.append(c)
+                freeAxesCount = len(freeAxes)
+                if freeAxesCount == 0:
+                    keys.append( (cornerNodeIds[cornerBits], ) )
+                elif freeAxesCount == 1:
+                    p = freeAxes[0]
+                    nodeId1 = cornerNodeIds[cornerBits]
+                    nodeId2 = cornerNodeIds[cornerBits + (1 << p)]
+                    if nodeId1 < nodeId2:
+                        keys.append( (nodeId1, nodeId2, index[p]) )
+                    else:
+                        keys.append( (nodeId2, nodeId1, numbersInXi[p] - index[p]) )
+                elif freeAxesCount == 2:
+                    p, q = freeAxes
+                    faceNodeIds = [ [ cornerNodeIds[cornerBits + u*(1 << p) + v*(1 << q)] for v in range(2) ] for u in range(2) ]
+                    minimumNodeId = min(min(faceNodeIds[0]), min(faceNodeIds[1]))
+                    u0, v0 = (0, 0) if (faceNodeIds[0][0] == minimumNodeId) else \
+                             (0, 1) if (faceNodeIds[0][1] == minimumNodeId) else \
+                             (1, 0) if (faceNodeIds[1][0] == minimumNodeId) else (1, 1)
+                    nodeIdP = faceNodeIds[1 - u0][v0]
+                    nodeIdQ = faceNodeIds[u0][1 - v0]
+                    indexP = index[p] if (u0 == 0) else (numbersInXi[p] - index[p])
+                    indexQ = index[q] if (v0 == 0) else (numbersInXi[q] - index[q])
+                    if nodeIdP < nodeIdQ:
+                        keys.append( (minimumNodeId, nodeIdP, nodeIdQ, indexP, indexQ) )
+                    else:
+                        keys.append( (minimumNodeId, nodeIdQ, nodeIdP, indexQ, indexP) )
+                else:
+                    keys.append(None)
+    return keys
+
+def _getElementLatticeTopologyKeys(coordinates, element, numbersInXi):
+    '''
+    :return: Lattice topology keys for element, see _getLatticeTopologyKeys(), or None
+    if element does not have 8 distinct corner nodes.
+    '''
+    cornerNodeIds = _getElementCornerNodeIdentifiers(coordinates, element)
+    if cornerNodeIds is None:
+        return None
+    return _getLatticeTopologyKeys(cornerNodeIds, *numbersInXi)
+
 class MeshRefinement:
     '''
     Class for refining a mesh from one region to another.
     '''
 
-    def __init__(self, sourceRegion, targetRegion, sourceAnnotationGroups = []):
+    def __init__(self, sourceRegion, targetRegion, sourceAnnotationGroups = [], shareNodesByTopology = False, useCubicHermite = False, useGridHash = False):
         '''
         Assumes targetRegion is empty.
         :param sourceAnnotationGroups: List of AnnotationGroup for source mesh in sourceRegion.
         A copy containing the refined elements is created by the MeshRefinement.
+        :param shareNodesByTopology: Set to True to share refined nodes on faces, edges and
+        corners of source elements by source node identifiers and lattice index instead of
+        searching by coordinates. Coordinate search is still used for elements without 8
+        distinct corner nodes e.g. collapsed apex elements. Unlike coordinate search,
+        coincident but distinct source nodes are not merged.
+        :param useCubicHermite: Set to True to refine into tricubic Hermite elements without
+        cross derivatives, with node derivatives evaluated from the source element and scaled
+        to the refined element size. Otherwise refined elements are trilinear Lagrange.
+        Where derivatives of a shared node evaluated in different source elements differ,
+        e.g. where xi directions change across source element boundaries or around
+        collapsed apex elements, the node is given another version of its derivatives and
+        refined elements map the version evaluated in their source element.
+        :param useGridHash: Set to True to find nodes by coordinates with a uniform grid hash
+        instead of an octree. This is faster for large meshes, and finds the same nodes.
         '''
         self._sourceRegion = sourceRegion
         self._sourceFm = sourceRegion.getFieldmodule()
         self._sourceCache = self._sourceFm.createFieldcache()
         self._sourceCoordinates = getOrCreateCoordinateField(self._sourceFm)
-        # get range of source coordinates for octree range
-        self._sourceFm.beginChange()
-        sourceNodes = self._sourceFm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
-        minimumsField = self._sourceFm.createFieldNodesetMinimum(self._sourceCoordinates, sourceNodes)
-        result, minimums = minimumsField.evaluateReal(self._sourceCache, 3)
-        assert result == ZINC_OK, 'MeshRefinement failed to get minimum coordinates'
-        maximumsField = self._sourceFm.createFieldNodesetMaximum(self._sourceCoordinates, sourceNodes)
-        result, maximums = maximumsField.evaluateReal(self._sourceCache, 3)
-        assert result == ZINC_OK, 'MeshRefinement failed to get maximum coordinates'
-        xrange = [ (maximums[i] - minimums[i]) for i in range(3) ]
-        edgeTolerance = 0.5*(max(xrange))
-        if edgeTolerance == 0.0:
-            edgeTolerance = 1.0
-        minimums = [ (minimums[i] - edgeTolerance) for i in range(3) ]
-        maximums = [ (maximums[i] + edgeTolerance) for i in range(3) ]
-        minimumsField = None
-        maximumsField = None
-        self._sourceFm.endChange()
         self._sourceMesh = self._sourceFm.findMeshByDimension(3)
         self._sourceElementiterator = self._sourceMesh.createElementiterator()
-        self._octree = Octree(minimums, maximums)
+        # octree or grid hash for finding nodes by coordinates, created with the first nodes
+        self._useGridHash = useGridHash
+        self._octree = None
 
         self._targetRegion = targetRegion
         self._targetFm = targetRegion.getFieldmodule()
@@ -59,16 +335,43 @@ class MeshRefinement:
         self._targetNodes = self._targetFm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
         self._nodetemplate = self._targetNodes.createNodetemplate()
         self._nodetemplate.defineField(self._targetCoordinates)
+        self._useCubicHermite = useCubicHermite
+        if useCubicHermite:
+            self._nodetemplate.setValueNumberOfVersions(self._targetCoordinates, -1, Node.VALUE_LABEL_D_DS1, 1)
+            self._nodetemplate.setValueNumberOfVersions(self._targetCoordinates, -1, Node.VALUE_LABEL_D_DS2, 1)
+            self._nodetemplate.setValueNumberOfVersions(self._targetCoordinates, -1, Node.VALUE_LABEL_D_DS3, 1)
 
         self._targetMesh = self._targetFm.findMeshByDimension(3)
-        self._targetBasis = self._targetFm.createElementbasis(3, Elementbasis.FUNCTION_TYPE_LINEAR_LAGRANGE)
-        self._targetEft = self._targetMesh.createElementfieldtemplate(self._targetBasis)
+        if useCubicHermite:
+            self._tricubichermite = eftfactory_tricubichermite(self._targetMesh, False)
+            self._targetEft = self._tricubichermite.createEftNoCrossDerivatives()
+        else:
+            self._targetBasis = self._targetFm.createElementbasis(3, Elementbasis.FUNCTION_TYPE_LINEAR_LAGRANGE)
+            self._targetEft = self._targetMesh.createElementfieldtemplate(self._targetBasis)
         self._targetElementtemplate = self._targetMesh.createElementtemplate()
         self._targetElementtemplate.setElementShapeType(Element.SHAPE_TYPE_CUBE)
         result = self._targetElementtemplate.defineField(self._targetCoordinates, -1, self._targetEft)
+        if useCubicHermite:
+            # map from node identifier to list of [ d1, d2, d3 ] for each derivative version
+            self._nodeDerivatives = {}
+            # map from number of derivative versions to node template
+            self._versionsNodetemplates = { 1 : self._nodetemplate }
+            # map from tuple of derivative version at each local node to element field template
+            self._versionsEfts = {}
+            self._elementtemplatePool = ElementtemplatePool(self._targetMesh, self._targetCoordinates)
 
         self._nodeIdentifier = 1
         self._elementIdentifier = 1
+        self._latticeXiCache = {}
+        self._basisTables = {}
+        self._sourceElementParameters = ElementParameters(self._sourceCoordinates)
+
+        self._shareNodesByTopology = shareNodesByTopology
+        # map from source topology key to target node identifier
+        self._topologyNodeIds = {}
+        # when sharing nodes by topology, octree is only populated once needed for a degenerate element
+        self._octreeActive = not shareNodesByTopology
+        self._octreePendingCoordinatesNodeIds = []
 
         self._annotationGroups = []
         self._sourceAndTargetMeshGroups = []
@@ -86,31 +389,246 @@ class MeshRefinement:
     def getAnnotationGroups(self):
         return self._annotationGroups
 
+    def _getLatticeXi(self, numberInXi1, numberInXi2, numberInXi3):
+        '''
+        Get xi coordinates of the regular lattice with the given numbers of
+        elements in each direction. Cached as refinement reuses the same numbers.
+        :return: List of [xi1, xi2, xi3] varying fastest in xi1, then xi2, then xi3.
+        '''
+        key = (numberInXi1, numberInXi2, numberInXi3)
+        latticeXi = self._latticeXiCache.get(key)
+        if latticeXi is None:
+            latticeXi = []
+            for k in range(numberInXi3 + 1):
+                xi3 = k/numberInXi3
+                for j in range(numberInXi2 + 1):
+                    xi2 = j/numberInXi2
+                    for i in range(numberInXi1 + 1):
+                        latticeXi.append([ i/numberInXi1, xi2, xi3 ])
+            self._latticeXiCache[key] = latticeXi
+        return latticeXi
+
+    def evaluateElementLatticeCoordinates(self, sourceElement, numberInXi1, numberInXi2, numberInXi3):
+        '''
+        Evaluate source coordinates over the whole regular xi lattice of sourceElement.
+        :return: List of (numberInXi1 + 1)*(numberInXi2 + 1)*(numberInXi3 + 1) coordinates,
+        varying fastest in xi1, then xi2, then xi3.
+        '''
+        latticeX, latticeD = _evaluateLatticeParameters(self._sourceCache, self._sourceCoordinates, sourceElement,
+            [ numberInXi1, numberInXi2, numberInXi3 ], self._getLatticeXi(numberInXi1, numberInXi2, numberInXi3),
+            None, self._basisTables, self._sourceElementParameters)
+        return latticeX
+
+    def _getLatticeDerivativeScales(self, numberInXi1, numberInXi2, numberInXi3):
+        '''
+        :return: Scales converting source xi derivatives to refined element derivatives,
+        or None if not refining into cubic Hermite elements.
+        '''
+        if not self._useCubicHermite:
+            return None
+        return [ 1.0/numberInXi1, 1.0/numberInXi2, 1.0/numberInXi3 ]
+
+    def evaluateElementLatticeParameters(self, sourceElement, numberInXi1, numberInXi2, numberInXi3):
+        '''
+        Evaluate source coordinates and, if refining into cubic Hermite elements, derivatives
+        scaled to the refined element size over the whole regular xi lattice of sourceElement.
+        :return: latticeX, latticeD. See evaluateElementLatticeCoordinates(). latticeD is a list of
+        [ d1, d2, d3 ] for each lattice point, or None if not using cubic Hermite.
+        '''
+        return _evaluateLatticeParameters(self._sourceCache, self._sourceCoordinates, sourceElement,
+            [ numberInXi1, numberInXi2, numberInXi3 ], self._getLatticeXi(numberInXi1, numberInXi2, numberInXi3),
+            self._getLatticeDerivativeScales(numberInXi1, numberInXi2, numberInXi3), self._basisTables,
+            self._sourceElementParameters)
+
+    def _createNode(self, x, d):
+        '''
+        Create target node with coordinates x.
+        :param d: List of derivatives d1, d2, d3 if using cubic Hermite, otherwise None.
+        :return: Identifier of new node.
+        '''
+        node = self._targetNodes.createNode(self._nodeIdentifier, self._nodetemplate)
+        self._targetCache.setNode(node)
+        result = self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_VALUE, 1, x)
+        if d:
+            self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_D_DS1, 1, d[0])
+            self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_D_DS2, 1, d[1])
+            self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_D_DS3, 1, d[2])
+            self._nodeDerivatives[self._nodeIdentifier] = [ d ]
+        nodeId = self._nodeIdentifier
+        self._nodeIdentifier += 1
+        return nodeId
+
+    def _getNodeDerivativesVersion(self, nodeId, d):
+        '''
+        Get the version of the derivatives of target node matching d, adding a new
+        version to the node if none match to within 1.0E-6 of the largest component.
+        :param d: List of derivatives d1, d2, d3 evaluated in the current source element.
+        :return: Derivatives version number starting at 1.
+        '''
+        versions = self._nodeDerivatives[nodeId]
+        for v in range(len(versions)):
+            dv = versions[v]
+            if (dv is d) or (dv == d):
+                return v + 1
+            tolerance = 0.0
+            for dvi in dv:
+                for value in dvi:
+                    if math.fabs(value) > tolerance:
+                        tolerance = math.fabs(value)
+            tolerance *= 1.0E-6
+            match = True
+            for di, dvi in zip(d, dv):
+                for value, valuev in zip(di, dvi):
+                    if math.fabs(value - valuev) > tolerance:
+                        match = False
+                        break
+                if not match:
+                    break
+            if match:
+                return v + 1
+        versions.append(d)
+        versionsCount = len(versions)
+        nodetemplate = self._versionsNodetemplates.get(versionsCount)
+        if nodetemplate is None:
+            nodetemplate = self._targetNodes.createNodetemplate()
+            nodetemplate.defineField(self._targetCoordinates)
+            for valueLabel in (Node.VALUE_LABEL_D_DS1, Node.VALUE_LABEL_D_DS2, Node.VALUE_LABEL_D_DS3):
+                nodetemplate.setValueNumberOfVersions(self._targetCoordinates, -1, valueLabel, versionsCount)
+            self._versionsNodetemplates[versionsCount] = nodetemplate
+        # merging a template redefining the field loses its parameters, so set them all again
+        node = self._targetNodes.findNodeByIdentifier(nodeId)
+        self._targetCache.setNode(node)
+        result, x = self._targetCoordinates.getNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_VALUE, 1, 3)
+        node.merge(nodetemplate)
+        self._targetCache.setNode(node)
+        self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_VALUE, 1, x)
+        for v in range(versionsCount):
+            dv = versions[v]
+            self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_D_DS1, v + 1, dv[0])
+            self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_D_DS2, v + 1, dv[1])
+            self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_D_DS3, v + 1, dv[2])
+        return versionsCount
+
+    def _getVersionsElementtemplate(self, versions):
+        '''
+        Get element template and tricubic Hermite element field template mapping
+        derivatives from the given version at each local node.
+        :param versions: Tuple of derivatives version for each of 8 local nodes.
+        :return: Zinc Elementtemplate, Elementfieldtemplate
+        '''
+        eft = self._versionsEfts.get(versions)
+        if eft is None:
+            eft = self._tricubichermite.createEftNoCrossDerivatives()
+            for f in range(1, eft.getNumberOfFunctions() + 1):
+                for t in range(1, eft.getFunctionNumberOfTerms(f) + 1):
+                    localNodeIndex = eft.getTermLocalNodeIndex(f, t)
+                    valueLabel = eft.getTermNodeValueLabel(f, t)
+                    if valueLabel != Node.VALUE_LABEL_VALUE:
+                        eft.setTermNodeParameter(f, t, localNodeIndex, valueLabel, versions[localNodeIndex - 1])
+            self._versionsEfts[versions] = eft
+        return self._elementtemplatePool.getElementtemplate(eft), eft
+
+    def _createOctree(self):
+        '''
+        Create octree or grid hash for finding nodes by coordinates, with tolerance
+        1.0E-6 times the diagonal of the range of source node coordinates padded by half
+        its largest extent on each side, so merging does not depend on element order.
+        The octree expands to contain all nodes added to it, so the padded range is
+        only used for the tolerance.
+        '''
+        self._sourceFm.beginChange()
+        sourceNodes = self._sourceFm.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+        minimumsField = self._sourceFm.createFieldNodesetMinimum(self._sourceCoordinates, sourceNodes)
+        result, minimums = minimumsField.evaluateReal(self._sourceCache, 3)
+        assert result == ZINC_OK, 'MeshRefinement failed to get minimum coordinates'
+        maximumsField = self._sourceFm.createFieldNodesetMaximum(self._sourceCoordinates, sourceNodes)
+        result, maximums = maximumsField.evaluateReal(self._sourceCache, 3)
+        assert result == ZINC_OK, 'MeshRefinement failed to get maximum coordinates'
+        minimumsField = None
+        maximumsField = None
+        self._sourceFm.endChange()
+        xrange = [ (maximums[c] - minimums[c]) for c in range(3) ]
+        edgeTolerance = 0.5*(max(xrange))
+        if edgeTolerance == 0.0:
+            edgeTolerance = 1.0
+        tolerance = 1.0E-6*math.sqrt(sum((xrange[c] + 2.0*edgeTolerance)*(xrange[c] + 2.0*edgeTolerance) for c in range(3)))
+        self._octree = GridHash(tolerance = tolerance) if self._useGridHash else Octree(tolerance = tolerance)
+
+    def _getOrCreateNodeByCoordinates(self, x, d):
+        '''
+        Find existing target node within tolerance of x in octree, or create it.
+        :param d: Derivatives for new node. See _createNode().
+        :return: Node identifier.
+        '''
+        nodeId = self._octree.findObjectByCoordinates(x)
+        if nodeId is None:
+            nodeId = self._createNode(x, d)
+            self._octree.addObjectAtCoordinates(x, nodeId)
+        return nodeId
+
+    def _activateOctree(self):
+        '''
+        Add boundary nodes created while sharing nodes by topology to the octree, so
+        they can be found by coordinates from degenerate elements.
+        '''
+        for x, nodeId in self._octreePendingCoordinatesNodeIds:
+            self._octree.addObjectAtCoordinates(x, nodeId)
+        self._octreePendingCoordinatesNodeIds = None
+        self._octreeActive = True
+
+    def _getLatticeNodeIdentifiersByTopology(self, latticeX, latticeD, keys):
+        '''
+        Get or create target nodes for lattice coordinates, sharing nodes by source topology.
+        New nodes not found by key are looked up in the octree only once degenerate
+        elements have been refined by coordinates.
+        :param latticeD: Lattice derivatives if using cubic Hermite, otherwise None.
+        :param keys: Lattice topology keys from _getLatticeTopologyKeys().
+        :return: List of node identifiers for latticeX.
+        '''
+        nids = []
+        for p in range(len(latticeX)):
+            x = latticeX[p]
+            d = latticeD[p] if latticeD else None
+            key = keys[p]
+            if key is None:
+                nids.append(self._createNode(x, d))
+                continue
+            nodeId = self._topologyNodeIds.get(key)
+            if nodeId is None:
+                if self._octreeActive:
+                    nodeId = self._getOrCreateNodeByCoordinates(x, d)
+                else:
+                    nodeId = self._createNode(x, d)
+                    self._octreePendingCoordinatesNodeIds.append( (x, nodeId) )
+                self._topologyNodeIds[key] = nodeId
+            nids.append(nodeId)
+        return nids
+
     def refineElementCubeStandard3d(self, sourceElement, numberInXi1, numberInXi2, numberInXi3):
+        latticeX, latticeD = self.evaluateElementLatticeParameters(sourceElement, numberInXi1, numberInXi2, numberInXi3)
+        self._refineElementCubeStandard3dFromLattice(sourceElement, latticeX, latticeD, numberInXi1, numberInXi2, numberInXi3)
+
+    def _refineElementCubeStandard3dFromLattice(self, sourceElement, latticeX, latticeD, numberInXi1, numberInXi2, numberInXi3):
+        '''
+        Create refined nodes and elements for sourceElement from its evaluated lattice parameters.
+        :param latticeX, latticeD: Coordinates and derivatives from evaluateElementLatticeParameters().
+        '''
+        if self._octree is None:
+            self._createOctree()
         meshGroups = []
         for sourceAndTargetMeshGroup in self._sourceAndTargetMeshGroups:
             if sourceAndTargetMeshGroup[0].containsElement(sourceElement):
                 meshGroups.append(sourceAndTargetMeshGroup[1])
         # create nodes
-        nids = []
-        xi = [ 0.0, 0.0, 0.0 ]
-        for k in range(numberInXi3 + 1):
-            xi[2] = k/numberInXi3
-            for j in range(numberInXi2 + 1):
-                xi[1] = j/numberInXi2
-                for i in range(numberInXi1 + 1):
-                    xi[0] = i/numberInXi1
-                    self._sourceCache.setMeshLocation(sourceElement, xi)
-                    result, x = self._sourceCoordinates.evaluateReal(self._sourceCache, 3)
-                    nodeId = self._octree.findObjectByCoordinates(x)
-                    if nodeId is None:
-                        node = self._targetNodes.createNode(self._nodeIdentifier, self._nodetemplate)
-                        self._targetCache.setNode(node)
-                        result = self._targetCoordinates.setNodeParameters(self._targetCache, -1, Node.VALUE_LABEL_VALUE, 1, x)
-                        nodeId = self._nodeIdentifier
-                        self._octree.addObjectAtCoordinates(x, nodeId)
-                        self._nodeIdentifier += 1
-                    nids.append(nodeId)
+        topologyKeys = _getElementLatticeTopologyKeys(self._sourceCoordinates, sourceElement,
+            (numberInXi1, numberInXi2, numberInXi3)) if self._shareNodesByTopology else None
+        if topologyKeys:
+            nids = self._getLatticeNodeIdentifiersByTopology(latticeX, latticeD, topologyKeys)
+        else:
+            if not self._octreeActive:
+                self._activateOctree()
+            nids = [ self._getOrCreateNodeByCoordinates(latticeX[p], latticeD[p] if latticeD else None) for p in range(len(latticeX)) ]
+        nodeVersions = [ self._getNodeDerivativesVersion(nids[p], latticeD[p]) for p in range(len(latticeX)) ] if latticeD else None
         # create elements
         for k in range(numberInXi3):
             ok = (numberInXi2 + 1)*(numberInXi1 + 1)
@@ -118,10 +636,17 @@ class MeshRefinement:
                 oj = (numberInXi1 + 1)
                 for i in range(numberInXi1):
                     bni = k*ok + j*oj + i
-                    element = self._targetMesh.createElement(self._elementIdentifier, self._targetElementtemplate)
+                    elementtemplate = self._targetElementtemplate
+                    eft = self._targetEft
+                    if nodeVersions:
+                        versions = ( nodeVersions[bni     ], nodeVersions[bni      + 1], nodeVersions[bni      + oj], nodeVersions[bni      + oj + 1],
+                                     nodeVersions[bni + ok], nodeVersions[bni + ok + 1], nodeVersions[bni + ok + oj], nodeVersions[bni + ok + oj + 1] )
+                        if max(versions) > 1:
+                            elementtemplate, eft = self._getVersionsElementtemplate(versions)
+                    element = self._targetMesh.createElement(self._elementIdentifier, elementtemplate)
                     enids = [ nids[bni     ], nids[bni      + 1], nids[bni      + oj], nids[bni      + oj + 1],
                               nids[bni + ok], nids[bni + ok + 1], nids[bni + ok + oj], nids[bni + ok + oj + 1] ]
-                    result = element.setNodesByIdentifier(self._targetEft, enids)
+                    result = element.setNodesByIdentifier(eft, enids)
                     #if result != ZINC_OK:
                     #print('Element', self._elementIdentifier, result, enids)
                     self._elementIdentifier += 1
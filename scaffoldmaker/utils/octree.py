@@ -5,35 +5,173 @@ Created on April 4, 2018
 @author: Richard Christie
 '''
 
-import copy
+from array import array
+import heapq
 import math
 
 class Octree:
     '''
-    Octree for searching for objects by coordinates
+    Octree for searching for objects by coordinates.
+    Object coordinates and octree nodes are held in flat arrays indexed by object number
+    and octree node number, with objects in each leaf chained in a linked list.
+    The root expands its bounds as needed to contain objects added outside them, so
+    bounds need not be known in advance.
+    Octree nodes contain coordinates from centre - halfSize inclusive to centre + halfSize
+    exclusive, with coordinates equal to a centre going to the upper child, so an old root
+    is always reached from the new root it is made a child of.
     '''
 
-    def __init__(self, minimums, maximums, tolerance = None):
+    __slots__ = ('_dimension', '_dimensionPower2', '_maxObjects', '_tolerance', '_initialHalfSize',
+        '_coordinates', '_objects', '_nextObject',
+        '_nodeCentres', '_nodeHalfSizes', '_nodeChildren', '_nodeFirstObject', '_nodeLastObject', '_nodeObjectsCount')
+
+    def __init__(self, minimums = None, maximums = None, tolerance = None, maxObjects = 20):
         '''
-        :param minimums: List of 3 minimum coordinate values. Caller to include any edge allowance.
-        :param maximums: List of 3 maximum coordinate values. Caller to include any edge allowance.
+        :param minimums: List of 3 minimum coordinate values, or None to start with a root
+        around the first object added. Caller to include any edge allowance.
+        :param maximums: List of 3 maximum coordinate values, or None if minimums is None.
         :param tolerance: If supplied, tolerance to use, or None to compute as 1.0E-6*diagonal.
+        Must be supplied if bounds are not.
+        :param maxObjects: Leaf capacity: number of objects stored in an octree node before it is
+        subdivided. Larger values use less memory but make searches slower.
         '''
         self._dimension = 3
         self._dimensionPower2 = 1 << self._dimension
-        self._maxObjects = 20
-        assert len(minimums) == self._dimension, 'Octree minimums is invalid length'
-        assert len(maximums) == self._dimension, 'Octree maximums is invalid length'
+        assert maxObjects > 0, 'Octree maxObjects must be positive'
+        self._maxObjects = maxObjects
+        assert (minimums is None) == (maximums is None), 'Octree minimums and maximums must both be supplied or both None'
+        if minimums is not None:
+            assert len(minimums) == self._dimension, 'Octree minimums is invalid length'
+            assert len(maximums) == self._dimension, 'Octree maximums is invalid length'
         if tolerance is None:
+            assert minimums is not None, 'Octree tolerance must be supplied if bounds are not'
             self._tolerance = 1.0E-6*math.sqrt(sum(((maximums[i] - minimums[i])*(maximums[i] - minimums[i])) for i in range(self._dimension)))
         else:
             self._tolerance = tolerance
-        self._minimums = copy.deepcopy(minimums)
-        self._maximums = copy.deepcopy(maximums)
-        # Octree is either leaf with _coordinatesObjects, or has 2**self._dimension children
-        self._coordinatesObjects = []
-        # exactly 2^self._dimension children, cycling in lowest x index fastest
-        self._children = None
+        assert self._tolerance > 0.0, 'Octree tolerance must be positive'
+        # half size of root created around first object if no bounds
+        self._initialHalfSize = 1.0E+4*self._tolerance
+        # objects: coordinates packed 3 per object, object, index of next object in same leaf or -1
+        self._coordinates = array('d')
+        self._objects = []
+        self._nextObject = array('l')
+        # octree nodes: centre and half size packed 3 per node; 2**dimension child node indexes
+        # cycling in lowest x index fastest, or all -1 for a leaf; first, last and number of
+        # objects in leaf
+        self._nodeCentres = array('d')
+        self._nodeHalfSizes = array('d')
+        self._nodeChildren = array('l')
+        self._nodeFirstObject = array('l')
+        self._nodeLastObject = array('l')
+        self._nodeObjectsCount = array('l')
+        if minimums is not None:
+            self._addNode([ 0.5*(minimums[c] + maximums[c]) for c in range(self._dimension) ],
+                [ 0.5*(maximums[c] - minimums[c]) for c in range(self._dimension) ])
+
+
+    def _addNode(self, centre, halfSize):
+        '''
+        Add a new empty leaf node to the node table.
+        :return: Index of new node.
+        '''
+        nodeIndex = len(self._nodeFirstObject)
+        self._nodeCentres.extend(centre)
+        self._nodeHalfSizes.extend(halfSize)
+        self._nodeChildren.extend([ -1 ]*self._dimensionPower2)
+        self._nodeFirstObject.append(-1)
+        self._nodeLastObject.append(-1)
+        self._nodeObjectsCount.append(0)
+        return nodeIndex
+
+
+    def _getLeafNodeIndex(self, x):
+        '''
+        :return: Index of leaf node that x is added to.
+        '''
+        nodeCentres = self._nodeCentres
+        nodeChildren = self._nodeChildren
+        nodeIndex = 0
+        while nodeChildren[nodeIndex*8] >= 0:
+            c3 = nodeIndex*3
+            i = 0
+            if x[0] >= nodeCentres[c3]:
+                i += 1
+            if x[1] >= nodeCentres[c3 + 1]:
+                i += 2
+            if x[2] >= nodeCentres[c3 + 2]:
+                i += 4
+            nodeIndex = nodeChildren[nodeIndex*8 + i]
+        return nodeIndex
+
+
+    def _addObjectIndexToLeaf(self, objectIndex, nodeIndex):
+        '''
+        Append object to end of linked list of objects in leaf node.
+        '''
+        self._nextObject[objectIndex] = -1
+        lastObjectIndex = self._nodeLastObject[nodeIndex]
+        if lastObjectIndex < 0:
+            self._nodeFirstObject[nodeIndex] = objectIndex
+        else:
+            self._nextObject[lastObjectIndex] = objectIndex
+        self._nodeLastObject[nodeIndex] = objectIndex
+        self._nodeObjectsCount[nodeIndex] += 1
+
+
+    def _subdivideNode(self, nodeIndex):
+        '''
+        Convert leaf node into 2**dimension child leaf nodes, moving its objects into them.
+        '''
+        c3 = nodeIndex*3
+        centre = self._nodeCentres[c3:c3 + 3]
+        childHalfSize = [ 0.5*h for h in self._nodeHalfSizes[c3:c3 + 3] ]
+        for i in range(self._dimensionPower2):
+            childCentre = [ (centre[c] + childHalfSize[c]) if (i & (1 << c)) else (centre[c] - childHalfSize[c]) for c in range(self._dimension) ]
+            self._nodeChildren[nodeIndex*8 + i] = self._addNode(childCentre, childHalfSize)
+        objectIndex = self._nodeFirstObject[nodeIndex]
+        self._nodeFirstObject[nodeIndex] = -1
+        self._nodeLastObject[nodeIndex] = -1
+        self._nodeObjectsCount[nodeIndex] = 0
+        while objectIndex >= 0:
+            nextObjectIndex = self._nextObject[objectIndex]
+            self._addObjectIndexToLeaf(objectIndex, self._getLeafNodeIndex(self._coordinates[objectIndex*3:objectIndex*3 + 3]))
+            objectIndex = nextObjectIndex
+
+
+    def _expandRootToContain(self, x):
+        '''
+        Make root node contain x, creating it around x if there are no nodes, otherwise
+        repeatedly making the root a child of a new root twice its size, extending towards x.
+        '''
+        if not self._nodeObjectsCount:
+            self._addNode([ x[c] for c in range(self._dimension) ], [ self._initialHalfSize ]*self._dimension)
+            return
+        while True:
+            centre = self._nodeCentres[0:3]
+            halfSize = self._nodeHalfSizes[0:3]
+            below = [ (x[c] < (centre[c] - halfSize[c])) for c in range(self._dimension) ]
+            if not (any(below) or any((x[c] >= (centre[c] + halfSize[c])) for c in range(self._dimension))):
+                return
+            # move old root to a new node index so root is always node 0
+            oldRootIndex = self._addNode(centre, halfSize)
+            self._nodeChildren[oldRootIndex*8:oldRootIndex*8 + 8] = self._nodeChildren[0:8]
+            self._nodeFirstObject[oldRootIndex] = self._nodeFirstObject[0]
+            self._nodeLastObject[oldRootIndex] = self._nodeLastObject[0]
+            self._nodeObjectsCount[oldRootIndex] = self._nodeObjectsCount[0]
+            newCentre = [ (centre[c] - halfSize[c]) if below[c] else (centre[c] + halfSize[c]) for c in range(self._dimension) ]
+            self._nodeCentres[0:3] = array('d', newCentre)
+            self._nodeHalfSizes[0:3] = array('d', [ 2.0*h for h in halfSize ])
+            self._nodeFirstObject[0] = -1
+            self._nodeLastObject[0] = -1
+            self._nodeObjectsCount[0] = 0
+            # old root is in the upper half of new root in directions it extended below
+            oldRootChild = sum((1 << c) for c in range(self._dimension) if below[c])
+            for i in range(self._dimensionPower2):
+                if i == oldRootChild:
+                    self._nodeChildren[i] = oldRootIndex
+                else:
+                    childCentre = [ (newCentre[c] + halfSize[c]) if (i & (1 << c)) else (newCentre[c] - halfSize[c]) for c in range(self._dimension) ]
+                    self._nodeChildren[i] = self._addNode(childCentre, halfSize)
 
 
     def _findObjectByCoordinates(self, x):
@@ -42,40 +180,52 @@ class Octree:
         :param x: 3 coordinates in a list.
         :return: nearest distance, nearest object or None, None if none found.
         '''
+        tolerance = self._tolerance
+        x1, x2, x3 = x[0], x[1], x[2]
+        coordinates = self._coordinates
+        nextObject = self._nextObject
+        nodeCentres = self._nodeCentres
+        nodeChildren = self._nodeChildren
+        nodeFirstObject = self._nodeFirstObject
         nearestDistance = None
-        nearestObject = None
-        if self._coordinatesObjects is not None:
-            for coordinatesObject in self._coordinatesObjects:
-                # cheaply determine if in 2*tolerance sized box around object
-                inBox = True
-                for c in range(self._dimension):
-                    if math.fabs(x[c] - coordinatesObject[0][c]) > self._tolerance:
-                        inBox = False
-                        break
-                if inBox:
-                    # now test exact distance
-                    distance = math.sqrt(sum((x[i] - coordinatesObject[0][i])*(x[i] - coordinatesObject[0][i]) for i in range(self._dimension)))
-                    if (distance < self._tolerance) and ((nearestDistance is None) or (distance < nearestDistance)):
-                        nearestDistance = distance
-                        nearestObject = coordinatesObject[1]
-        else:
-            centre = self._children[0]._maximums
-            for i in range(self._dimensionPower2):
-                inBoundsPlusTolerance = True
-                for c in range(self._dimension):
-                    if i & (1 << c):
-                        if x[c] < (centre[c] - self._tolerance):
-                            inBoundsPlusTolerance = False
-                            break
-                    elif x[c] > (centre[c] + self._tolerance):
-                        inBoundsPlusTolerance = False
-                        break
-                if inBoundsPlusTolerance:
-                    distance, obj = self._children[i]._findObjectByCoordinates(x)
-                    if (distance is not None) and ((nearestDistance is None) or (distance < nearestDistance)):
-                        nearestDistance = distance
-                        nearestObject = obj
-        return nearestDistance, nearestObject
+        nearestObjectIndex = -1
+        nodeIndexes = [ 0 ] if nodeFirstObject else []
+        while nodeIndexes:
+            nodeIndex = nodeIndexes.pop()
+            n8 = nodeIndex*8
+            if nodeChildren[n8] < 0:
+                objectIndex = nodeFirstObject[nodeIndex]
+                while objectIndex >= 0:
+                    # cheaply determine if in 2*tolerance sized box around object
+                    o3 = objectIndex*3
+                    dx1 = x1 - coordinates[o3]
+                    if -tolerance <= dx1 <= tolerance:
+                        dx2 = x2 - coordinates[o3 + 1]
+                        if -tolerance <= dx2 <= tolerance:
+                            dx3 = x3 - coordinates[o3 + 2]
+                            if -tolerance <= dx3 <= tolerance:
+                                # now test exact distance
+                                distance = math.sqrt(dx1*dx1 + dx2*dx2 + dx3*dx3)
+                                if (distance < tolerance) and ((nearestDistance is None) or (distance < nearestDistance) or \
+                                        ((distance == nearestDistance) and (objectIndex < nearestObjectIndex))):
+                                    nearestDistance = distance
+                                    nearestObjectIndex = objectIndex
+                    objectIndex = nextObject[objectIndex]
+            else:
+                # visit all children within tolerance of x
+                c3 = nodeIndex*3
+                d1 = x1 - nodeCentres[c3]
+                d2 = x2 - nodeCentres[c3 + 1]
+                d3 = x3 - nodeCentres[c3 + 2]
+                lower1, upper1 = d1 <= tolerance, d1 >= -tolerance
+                lower2, upper2 = d2 <= tolerance, d2 >= -tolerance
+                lower3, upper3 = d3 <= tolerance, d3 >= -tolerance
+                for i in range(8):
+                    if ((upper1 if (i & 1) else lower1) and (upper2 if (i & 2) else lower2) and (upper3 if (i & 4) else lower3)):
+                        nodeIndexes.append(nodeChildren[n8 + i])
+        if nearestObjectIndex < 0:
+            return None, None
+        return nearestDistance, self._objects[nearestObjectIndex]
 
 
     def findObjectByCoordinates(self, x):
@@ -90,38 +240,190 @@ class Octree:
 
     def addObjectAtCoordinates(self, x, obj):
         '''
-        Add object at coordianates to octree.
+        Add object at coordinates to octree.
         Caller must have received None result for findObjectByCoordinates() first!
-        Assumes caller has verified x is within range of Octree.
+        Expands octree bounds if x is outside them.
         :param x: 3 coordinates in a list.
         :param obj: object to store with coordinates.
         '''
-        if self._coordinatesObjects is not None:
-            if len(self._coordinatesObjects) < self._maxObjects:
-                self._coordinatesObjects.append( (copy.deepcopy(x), obj) )
-                return
+        nodeCentres = self._nodeCentres
+        nodeHalfSizes = self._nodeHalfSizes
+        if (not nodeCentres) or \
+                (x[0] < (nodeCentres[0] - nodeHalfSizes[0])) or (x[0] >= (nodeCentres[0] + nodeHalfSizes[0])) or \
+                (x[1] < (nodeCentres[1] - nodeHalfSizes[1])) or (x[1] >= (nodeCentres[1] + nodeHalfSizes[1])) or \
+                (x[2] < (nodeCentres[2] - nodeHalfSizes[2])) or (x[2] >= (nodeCentres[2] + nodeHalfSizes[2])):
+            self._expandRootToContain(x)
+        objectIndex = len(self._objects)
+        self._coordinates.extend((x[0], x[1], x[2]))
+        self._objects.append(obj)
+        self._nextObject.append(-1)
+        nodeIndex = self._getLeafNodeIndex(x)
+        # don't subdivide below tolerance so objects crowded together can't subdivide forever
+        while (self._nodeObjectsCount[nodeIndex] >= self._maxObjects) and \
+                (min(self._nodeHalfSizes[nodeIndex*3:nodeIndex*3 + 3]) > self._tolerance):
+            self._subdivideNode(nodeIndex)
+            nodeIndex = self._getLeafNodeIndex(x)
+        self._addObjectIndexToLeaf(objectIndex, nodeIndex)
+
+
+    def findObjectsByCoordinates(self, xList):
+        '''
+        Find closest existing object within tolerance of each of xList.
+        :param xList: List of coordinates, each a list of 3 values.
+        :return: List of nearest object or None if not found, for each of xList.
+        '''
+        findObject = self._findObjectByCoordinates
+        return [ findObject(x)[1] for x in xList ]
+
+
+    def addObjectsAtCoordinates(self, xList, objs):
+        '''
+        Add objects at respective coordinates to octree.
+        Caller must have received None result for each of xList from findObjectsByCoordinates() first!
+        :param xList: List of coordinates, each a list of 3 values.
+        :param objs: List of objects to store with coordinates, same length as xList.
+        '''
+        assert len(xList) == len(objs), 'Octree addObjectsAtCoordinates lists have different lengths'
+        addObject = self.addObjectAtCoordinates
+        for x, obj in zip(xList, objs):
+            addObject(x, obj)
+
+
+    def _getNodeDistance(self, nodeIndex, x):
+        '''
+        :return: Distance from x to nearest point in bounds of octree node, 0.0 if inside.
+        '''
+        c3 = nodeIndex*3
+        sum2 = 0.0
+        for c in range(self._dimension):
+            d = math.fabs(x[c] - self._nodeCentres[c3 + c]) - self._nodeHalfSizes[c3 + c]
+            if d > 0.0:
+                sum2 += d*d
+        return math.sqrt(sum2)
+
+
+    def findObjectsWithinRadius(self, x, radius):
+        '''
+        Find all objects with |x - ox| <= radius.
+        :param x: 3 coordinates in a list.
+        :param radius: Search radius.
+        :return: List of (distance, object) in order of increasing distance.
+        '''
+        x1, x2, x3 = x[0], x[1], x[2]
+        coordinates = self._coordinates
+        nextObject = self._nextObject
+        nodeCentres = self._nodeCentres
+        nodeChildren = self._nodeChildren
+        nodeFirstObject = self._nodeFirstObject
+        distanceObjectIndexes = []
+        nodeIndexes = [ 0 ] if nodeFirstObject else []
+        while nodeIndexes:
+            nodeIndex = nodeIndexes.pop()
+            n8 = nodeIndex*8
+            if nodeChildren[n8] < 0:
+                objectIndex = nodeFirstObject[nodeIndex]
+                while objectIndex >= 0:
+                    o3 = objectIndex*3
+                    dx1 = x1 - coordinates[o3]
+                    dx2 = x2 - coordinates[o3 + 1]
+                    dx3 = x3 - coordinates[o3 + 2]
+                    distance = math.sqrt(dx1*dx1 + dx2*dx2 + dx3*dx3)
+                    if distance <= radius:
+                        distanceObjectIndexes.append((distance, objectIndex))
+                    objectIndex = nextObject[objectIndex]
+            else:
+                c3 = nodeIndex*3
+                d1 = x1 - nodeCentres[c3]
+                d2 = x2 - nodeCentres[c3 + 1]
+                d3 = x3 - nodeCentres[c3 + 2]
+                lower1, upper1 = d1 <= radius, d1 >= -radius
+                lower2, upper2 = d2 <= radius, d2 >= -radius
+                lower3, upper3 = d3 <= radius, d3 >= -radius
+                for i in range(8):
+                    if ((upper1 if (i & 1) else lower1) and (upper2 if (i & 2) else lower2) and (upper3 if (i & 4) else lower3)):
+                        nodeIndexes.append(nodeChildren[n8 + i])
+        distanceObjectIndexes.sort()
+        return [ (distance, self._objects[objectIndex]) for distance, objectIndex in distanceObjectIndexes ]
+
+
+    def findNearest(self, x, k = 1):
+        '''
+        Find the k objects nearest to x, searching octree nodes in order of distance.
+        :param x: 3 coordinates in a list.
+        :param k: Maximum number of objects to find.
+        :return: List of up to k (distance, object) in order of increasing distance.
+        '''
+        if (k < 1) or (not self._nodeFirstObject):
+            return []
+        coordinates = self._coordinates
+        nextObject = self._nextObject
+        nodeChildren = self._nodeChildren
+        nodeFirstObject = self._nodeFirstObject
+        # max heap of k nearest as (-distance, -objectIndex), so earliest added wins ties
+        nearest = []
+        # min heap of octree nodes to visit by distance from x
+        nodeHeap = [ (0.0, 0) ]
+        while nodeHeap:
+            nodeDistance, nodeIndex = heapq.heappop(nodeHeap)
+            if (len(nearest) == k) and (nodeDistance > -nearest[0][0]):
+                break
+            n8 = nodeIndex*8
+            if nodeChildren[n8] < 0:
+                objectIndex = nodeFirstObject[nodeIndex]
+                while objectIndex >= 0:
+                    o3 = objectIndex*3
+                    distance = math.sqrt(sum((x[c] - coordinates[o3 + c])*(x[c] - coordinates[o3 + c]) for c in range(self._dimension)))
+                    item = (-distance, -objectIndex)
+                    if len(nearest) < k:
+                        heapq.heappush(nearest, item)
+                    elif item > nearest[0]:
+                        heapq.heapreplace(nearest, item)
+                    objectIndex = nextObject[objectIndex]
             else:
-                # subdivide and add coordinatesObjects plus new object to new children
-                coordinatesObjects = self._coordinatesObjects
-                self._coordinatesObjects = None
-                self._children = []
                 for i in range(self._dimensionPower2):
-                    childMinimums = copy.deepcopy(self._minimums)
-                    childMaximums = copy.deepcopy(self._maximums)
-                    for c in range(self._dimension):
-                        if i & (1 << c):
-                            childMinimums[c] = 0.5*(self._minimums[c] + self._maximums[c])
-                        else:
-                            childMaximums[c] = 0.5*(self._minimums[c] + self._maximums[c])
-                    child = Octree(childMinimums, childMaximums, self._tolerance)
-                    self._children.append(child)
-                # add coordinatesObjects to children
-                for coordinatesObject in coordinatesObjects:
-                    self.addObjectAtCoordinates(coordinatesObject[0], coordinatesObject[1])
-        # add the new object to the first child it fits in, using efficient octree search
-        i = 0
-        centre = self._children[0]._maximums
-        for c in range(self._dimension):
-            if x[c] > centre[c]:
-                i += 1 << c
-        self._children[i].addObjectAtCoordinates(x, obj)
+                    childIndex = nodeChildren[n8 + i]
+                    heapq.heappush(nodeHeap, (self._getNodeDistance(childIndex, x), childIndex))
+        nearest.sort(reverse = True)
+        return [ (-negativeDistance, self._objects[-negativeObjectIndex]) for negativeDistance, negativeObjectIndex in nearest ]
+
+
+    def removeObject(self, x, obj):
+        '''
+        Remove object from octree.
+        :param x: 3 coordinates in a list, exactly as object was added with.
+        :param obj: object to remove. First object at x equal to it is removed.
+        :return: True if object removed, False if not found.
+        '''
+        if not self._nodeFirstObject:
+            return False
+        nodeIndex = self._getLeafNodeIndex(x)
+        previousObjectIndex = -1
+        objectIndex = self._nodeFirstObject[nodeIndex]
+        while objectIndex >= 0:
+            if self._objects[objectIndex] == obj:
+                nextObjectIndex = self._nextObject[objectIndex]
+                if previousObjectIndex < 0:
+                    self._nodeFirstObject[nodeIndex] = nextObjectIndex
+                else:
+                    self._nextObject[previousObjectIndex] = nextObjectIndex
+                if nextObjectIndex < 0:
+                    self._nodeLastObject[nodeIndex] = previousObjectIndex
+                self._nodeObjectsCount[nodeIndex] -= 1
+                # mark as removed and release object
+                self._nextObject[objectIndex] = -2
+                self._objects[objectIndex] = None
+                return True
+            previousObjectIndex = objectIndex
+            objectIndex = self._nextObject[objectIndex]
+        return False
+
+
+    def iterateObjects(self):
+        '''
+        Iterate over all objects in octree in the order added.
+        :return: Generator yielding (coordinates list, object).
+        '''
+        for objectIndex in range(len(self._objects)):
+            if self._nextObject[objectIndex] != -2:
+                o3 = objectIndex*3
+                yield list(self._coordinates[o3:o3 + 3]), self._objects[objectIndex]
@@ -0,0 +1,247 @@
+'''
+Class for caching generated scaffolds on disk.
+Created on Oct 17, 2026
+'''
+
+import hashlib
+import inspect
+import json
+import os
+import re
+from scaffoldmaker.annotation.annotationgroup import AnnotationGroup
+from opencmiss.zinc.field import Field
+
+def getScaffoldmakerVersion():
+    '''
+    :return: Installed scaffoldmaker package version string, or 'unknown' if not installed.
+    '''
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('scaffoldmaker').version
+    except Exception:
+        return 'unknown'
+
+def getSourceFilesHash(paths):
+    '''
+    :param paths: List of paths of source files.
+    :return: Hex string hash of the contents of the files, or 'unknown' if any can't be read.
+    '''
+    sha = hashlib.sha256()
+    try:
+        for path in paths:
+            with open(path, 'rb') as f:
+                sha.update(f.read())
+    except (IOError, OSError):
+        return 'unknown'
+    return sha.hexdigest()
+
+def getPackageSourceFiles():
+    '''
+    :return: Sorted list of paths of all python source files in the scaffoldmaker package.
+    '''
+    packageDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = []
+    for directory, directoryNames, fileNames in os.walk(packageDirectory):
+        paths += [ os.path.join(directory, fileName) for fileName in fileNames if fileName.endswith('.py') ]
+    return sorted(paths)
+
+def getNormalisedOptionValue(value):
+    '''
+    :return: Option value with integers converted to float, also in nested lists and dicts,
+    so equal numeric values are serialised the same way e.g. 1 and 1.0.
+    '''
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [ getNormalisedOptionValue(v) for v in value ]
+    if isinstance(value, dict):
+        return { k : getNormalisedOptionValue(v) for k, v in value.items() }
+    return value
+
+def clearRegion(region):
+    '''
+    Remove all elements, nodes and data points from region and unmanage its fields so
+    they are destroyed once no longer used, e.g. after a failed read.
+    '''
+    fm = region.getFieldmodule()
+    fm.beginChange()
+    for dimension in range(3, 0, -1):
+        fm.findMeshByDimension(dimension).destroyAllElements()
+    for domainType in (Field.DOMAIN_TYPE_NODES, Field.DOMAIN_TYPE_DATAPOINTS):
+        fm.findNodesetByFieldDomainType(domainType).destroyAllNodes()
+    fielditerator = fm.createFielditerator()
+    field = fielditerator.next()
+    while field.isValid():
+        field.setManaged(False)
+        field = fielditerator.next()
+    fm.endChange()
+
+
+class ScaffoldCache:
+    '''
+    On-disk cache of scaffolds generated by mesh types, so generating the same scaffold
+    again reads it from file instead. Entries are keyed by a hash of the mesh type name,
+    scaffoldmaker version, source code of the scaffoldmaker package and mesh type module,
+    and options, and store the region as an EX file with the annotation groups in a JSON
+    file named by the 64 character hex key. Only files named this way are ever removed,
+    so other files in the cache directory are left alone. Least recently used entries
+    are removed when the total size of the cache exceeds its limit.
+    Parameters are stored to EX file precision.
+    '''
+
+    _keyPattern = re.compile('^[0-9a-f]{64}$')
+
+    def __init__(self, cacheDirectory, maximumSizeBytes = 1024*1024*1024):
+        '''
+        :param cacheDirectory: Directory to store cached scaffolds in. Created if needed.
+        :param maximumSizeBytes: Total size of cached files above which least recently
+        used entries are removed.
+        '''
+        assert maximumSizeBytes > 0, 'ScaffoldCache maximumSizeBytes must be positive'
+        self._cacheDirectory = cacheDirectory
+        self._maximumSizeBytes = maximumSizeBytes
+        self._version = getScaffoldmakerVersion()
+        self._packageSourceHash = getSourceFilesHash(getPackageSourceFiles())
+        # map from mesh type to hash of its module source
+        self._meshtypeSourceHashes = {}
+        os.makedirs(cacheDirectory, exist_ok = True)
+
+    def _getMeshtypeSourceHash(self, meshtype):
+        '''
+        :return: Hex string hash of source of module defining meshtype, 'unknown' if not found.
+        '''
+        sourceHash = self._meshtypeSourceHashes.get(meshtype)
+        if sourceHash is None:
+            try:
+                sourceHash = getSourceFilesHash([ inspect.getsourcefile(meshtype) ])
+            except TypeError:
+                sourceHash = 'unknown'
+            self._meshtypeSourceHashes[meshtype] = sourceHash
+        return sourceHash
+
+    def getKey(self, meshtype, options):
+        '''
+        :param meshtype: Mesh type class e.g. MeshType_3d_box1.
+        :param options: Dict of mesh type options.
+        :return: Hex string hash of mesh type name, scaffoldmaker version, source and options,
+        with numeric option values compared by value.
+        '''
+        description = json.dumps({
+            'meshtype' : meshtype.__name__,
+            'version' : self._version,
+            'packageSource' : self._packageSourceHash,
+            'meshtypeSource' : self._getMeshtypeSourceHash(meshtype),
+            'options' : getNormalisedOptionValue(options) }, sort_keys = True, separators = (',', ':'))
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def _getPaths(self, key):
+        '''
+        :return: Path of region EX file, path of annotation JSON file for key.
+        '''
+        basePath = os.path.join(self._cacheDirectory, key)
+        return basePath + '.exf', basePath + '.json'
+
+    def generateMesh(self, meshtype, region, options):
+        '''
+        Generate mesh with meshtype.generateMesh(region, options), or read it from the cache
+        if previously generated with the same options and version.
+        :param meshtype: Mesh type class e.g. MeshType_3d_box1.
+        :param region: Zinc region to create mesh in. Must be empty.
+        :param options: Dict containing options. See meshtype.getDefaultOptions().
+        :return: As for meshtype.generateMesh: list of AnnotationGroup or None.
+        '''
+        key = self.getKey(meshtype, options)
+        exPath, jsonPath = self._getPaths(key)
+        if os.path.isfile(exPath) and os.path.isfile(jsonPath):
+            annotationGroups = self._readEntry(region, exPath, jsonPath)
+            if annotationGroups is not False:
+                return annotationGroups
+        annotationGroups = meshtype.generateMesh(region, options)
+        self._writeEntry(region, annotationGroups, exPath, jsonPath)
+        self._evict()
+        return annotationGroups
+
+    def _readEntry(self, region, exPath, jsonPath):
+        '''
+        Read cached region and annotation groups and mark entry as recently used.
+        :return: List of AnnotationGroup or None, or False if entry could not be read,
+        in which case region is cleared so the scaffold can be generated in it.
+        '''
+        try:
+            with open(jsonPath, 'r') as f:
+                annotations = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+        fm = region.getFieldmodule()
+        fm.beginChange()
+        result = region.readFile(exPath)
+        if result != 1:
+            fm.endChange()
+            clearRegion(region)
+            return False
+        annotationGroups = None
+        if annotations is not None:
+            annotationGroups = [ AnnotationGroup(region, a['name'], FMANumber = a['FMANumber'], lyphID = a['lyphID']) for a in annotations ]
+        fm.endChange()
+        for path in [ exPath, jsonPath ]:
+            try:
+                os.utime(path, None)
+            except OSError:
+                # removed by concurrent eviction; region is already read
+                pass
+        return annotationGroups
+
+    def _writeEntry(self, region, annotationGroups, exPath, jsonPath):
+        '''
+        Write region and annotation groups to the cache, via temporary files so concurrent
+        readers never see partial entries.
+        '''
+        annotations = None
+        if annotationGroups is not None:
+            annotations = [ { 'name' : a.getName(), 'FMANumber' : a.getFMANumber(), 'lyphID' : a.getLyphID() } for a in annotationGroups ]
+        suffix = '.tmp' + str(os.getpid())
+        if region.writeFile(exPath + suffix) != 1:
+            return
+        with open(jsonPath + suffix, 'w') as f:
+            json.dump(annotations, f)
+        os.replace(exPath + suffix, exPath)
+        os.replace(jsonPath + suffix, jsonPath)
+
+    def _evict(self):
+        '''
+        Remove least recently used entries until total size is within limit.
+        '''
+        entries = {}
+        totalSize = 0
+        for fileName in os.listdir(self._cacheDirectory):
+            key, extension = os.path.splitext(fileName)
+            if (extension not in ('.exf', '.json')) or (not self._keyPattern.match(key)):
+                continue
+            path = os.path.join(self._cacheDirectory, fileName)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            size, mtime = entries.get(key, (0, 0.0))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+            totalSize += stat.st_size
+        for key in sorted(entries, key = lambda k: entries[k][1]):
+            if totalSize <= self._maximumSizeBytes:
+                break
+            for path in self._getPaths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            totalSize -= entries[key][0]
+
+    def clear(self):
+        '''
+        Remove all entries from the cache, leaving other files in the cache directory.
+        '''
+        for fileName in os.listdir(self._cacheDirectory):
+            key, extension = os.path.splitext(fileName)
+            if (extension in ('.exf', '.json')) and self._keyPattern.match(key):
+                os.remove(os.path.join(self._cacheDirectory, fileName))
@@ -31,3 +31,72 @@ def normalise(v):
     '''
     mag = math.sqrt(sum(c*c for c in v))
     return [ c/mag for c in v ]
+
+def crossproduct3List(aList, bList):
+    '''
+    Batch version of crossproduct3 over rows of 3-D vectors.
+    :return: list of vector 3-D cross products of a and b for each a, b in aList, bList
+    '''
+    assert len(aList) == len(bList), 'crossproduct3List lists have different lengths'
+    return [ [ a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0] ] for a, b in zip(aList, bList) ]
+
+def dotproductList(aList, bList):
+    '''
+    Batch version of dotproduct over rows of 3-D vectors.
+    :return: list of dot products of a and b for each a, b in aList, bList
+    '''
+    assert len(aList) == len(bList), 'dotproductList lists have different lengths'
+    return [ (a[0]*b[0] + a[1]*b[1] + a[2]*b[2]) for a, b in zip(aList, bList) ]
+
+def magnitudeList(vList):
+    '''
+    Batch version of magnitude over rows of 3-D vectors.
+    :return: list of scalar magnitudes of each v in vList
+    '''
+    sqrt = math.sqrt
+    return [ sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2]) for v in vList ]
+
+def normaliseList(vList, length = 1.0):
+    '''
+    Batch version of normalise over rows of 3-D vectors.
+    :param length: Magnitude to scale each vector to. Default 1.0 gives unit vectors.
+    :return: list of each v in vList scaled to length
+    '''
+    sqrt = math.sqrt
+    result = []
+    for v in vList:
+        scale = length/sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
+        result.append([ v[0]*scale, v[1]*scale, v[2]*scale ])
+    return result
+
+def _getRotationMatrix(axis, angleRadians):
+    '''
+    :param axis: 3-D unit vector to rotate about.
+    :return: 3x3 matrix rotating by angleRadians about axis using right hand rule, as list of rows
+    '''
+    cosAngle = math.cos(angleRadians)
+    sinAngle = math.sin(angleRadians)
+    omc = 1.0 - cosAngle
+    x, y, z = axis[0], axis[1], axis[2]
+    return [
+        [ cosAngle + x*x*omc, x*y*omc - z*sinAngle, x*z*omc + y*sinAngle ],
+        [ y*x*omc + z*sinAngle, cosAngle + y*y*omc, y*z*omc - x*sinAngle ],
+        [ z*x*omc - y*sinAngle, z*y*omc + x*sinAngle, cosAngle + z*z*omc ] ]
+
+def rotateAboutAxis(v, axis, angleRadians):
+    '''
+    :param axis: 3-D unit vector to rotate about.
+    :return: vector 3-D v rotated by angleRadians about axis using right hand rule
+    '''
+    return rotateAboutAxisList([ v ], axis, angleRadians)[0]
+
+def rotateAboutAxisList(vList, axis, angleRadians):
+    '''
+    Batch version of rotateAboutAxis, computing rotation matrix once for all vectors.
+    :param axis: 3-D unit vector to rotate about.
+    :return: list of each 3-D v in vList rotated by angleRadians about axis
+    '''
+    r1, r2, r3 = _getRotationMatrix(axis, angleRadians)
+    return [ [ r1[0]*v[0] + r1[1]*v[1] + r1[2]*v[2],
+               r2[0]*v[0] + r2[1]*v[1] + r2[2]*v[2],
+               r3[0]*v[0] + r3[1]*v[1] + r3[2]*v[2] ] for v in vList ]
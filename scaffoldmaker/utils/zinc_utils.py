@@ -7,6 +7,7 @@ Created on Jan 4, 2018
 
 from opencmiss.zinc.field import Field
 from opencmiss.zinc.node import Node
+from opencmiss.zinc.status import OK as ZINC_OK
 from scaffoldmaker.utils.interpolation import *
 import scaffoldmaker.utils.vector as vector
 
@@ -77,6 +78,179 @@ def getMaximumElementIdentifier(mesh):
         element = elementiterator.next()
     return maximumElementId
 
+class IdentifierAllocator:
+    '''
+    Allocates unused identifiers for new nodes or elements in a nodeset or mesh in O(1)
+    per allocation, after finding the maximum existing identifier once on construction.
+    All objects in the nodeset or mesh must be created with identifiers from the allocator
+    while it is in use; pass it to later generators to continue numbering without rescanning.
+    '''
+
+    def __init__(self, domain, firstIdentifier = None):
+        '''
+        :param domain: Zinc Nodeset or Mesh to allocate identifiers for.
+        :param firstIdentifier: First identifier to allocate, or None to use one more than the
+        maximum identifier in domain, or 1 if empty.
+        '''
+        if firstIdentifier is None:
+            if hasattr(domain, 'createNodeiterator'):
+                maximumIdentifier = getMaximumNodeIdentifier(domain)
+            else:
+                maximumIdentifier = getMaximumElementIdentifier(domain)
+            firstIdentifier = max(maximumIdentifier, 0) + 1
+        assert firstIdentifier > 0, 'IdentifierAllocator.  First identifier must be positive'
+        self._nextIdentifier = firstIdentifier
+
+    def getNextIdentifier(self):
+        '''
+        :return: Identifier that will be returned by the next call to allocate().
+        '''
+        return self._nextIdentifier
+
+    def allocate(self, count = 1):
+        '''
+        Allocate a range of consecutive identifiers.
+        :param count: Number of identifiers to allocate, at least 1.
+        :return: First identifier in range.
+        '''
+        assert count > 0, 'IdentifierAllocator.allocate.  Count must be positive'
+        identifier = self._nextIdentifier
+        self._nextIdentifier += count
+        return identifier
+
+    def reserveRanges(self, counts):
+        '''
+        Reserve consecutive ranges of identifiers up front, e.g. one for each parallel worker
+        so they can create objects without further coordination.
+        :param counts: List of number of identifiers in each range.
+        :return: List of first identifier in each range.
+        '''
+        return [ self.allocate(count) for count in counts ]
+
+def _getValueLabelVersion(key):
+    '''
+    :param key: Node value label, or tuple(valueLabel, version).
+    :return: valueLabel, version. Version is 1 if not in key.
+    '''
+    if isinstance(key, tuple):
+        return key
+    return key, 1
+
+def createNodesWithParameters(field, nodeset, nodetemplate, nodeIdentifiers, valueLabelParameters):
+    '''
+    Create nodes with nodetemplate and set their field parameters, all within a single
+    begin/end change.
+    :param field: Zinc finite element field to set parameters of, defined by nodetemplate.
+    :param nodeset: Zinc nodeset to create nodes in.
+    :param nodetemplate: Zinc node template to create nodes with.
+    :param nodeIdentifiers: List of identifiers of nodes to create, which must not already exist.
+    :param valueLabelParameters: Dict mapping node value label, or tuple(valueLabel, version),
+    to list of parameters for each of nodeIdentifiers. Parameters are set in order of dict.
+        e.g. { Node.VALUE_LABEL_VALUE : nx, (Node.VALUE_LABEL_D_DS1, 2) : nd1 }
+    :return: Number of nodes created.
+    '''
+    nodesCount = len(nodeIdentifiers)
+    labelsParameters = []
+    for key, parametersList in valueLabelParameters.items():
+        assert len(parametersList) == nodesCount, 'createNodesWithParameters.  Parameters list for ' + str(key) + ' has wrong length'
+        valueLabel, version = _getValueLabelVersion(key)
+        labelsParameters.append((valueLabel, version, parametersList))
+    fieldmodule = field.getFieldmodule()
+    fieldmodule.beginChange()
+    cache = fieldmodule.createFieldcache()
+    createNode = nodeset.createNode
+    setNode = cache.setNode
+    setNodeParameters = field.setNodeParameters
+    for n in range(nodesCount):
+        node = createNode(nodeIdentifiers[n], nodetemplate)
+        setNode(node)
+        for valueLabel, version, parametersList in labelsParameters:
+            setNodeParameters(cache, -1, valueLabel, version, parametersList[n])
+    fieldmodule.endChange()
+    return nodesCount
+
+def createElementsWithNodes(mesh, elementtemplate, eft, elementIdentifiers, elementsNodeIdentifiers, elementsScaleFactors = None, meshGroups = []):
+    '''
+    Create elements with elementtemplate and set their nodes and any scale factors for eft,
+    all within a single begin/end change.
+    :param mesh: Zinc mesh to create elements in.
+    :param elementtemplate: Zinc element template to create elements with, defining a field with eft.
+    :param eft: Zinc element field template to set nodes and scale factors for.
+    :param elementIdentifiers: List of identifiers of elements to create, which must not already exist.
+    :param elementsNodeIdentifiers: List of node identifiers for each of elementIdentifiers,
+    each a list in local node order of eft.
+    :param elementsScaleFactors: Optional list of scale factors for each of elementIdentifiers,
+    each a list of local scale factors of eft. Not set if None.
+    :param meshGroups: List of Zinc mesh groups to add all new elements to.
+    :return: Number of elements created.
+    '''
+    elementsCount = len(elementIdentifiers)
+    assert len(elementsNodeIdentifiers) == elementsCount, 'createElementsWithNodes.  Node identifiers list has wrong length'
+    assert (elementsScaleFactors is None) or (len(elementsScaleFactors) == elementsCount), 'createElementsWithNodes.  Scale factors list has wrong length'
+    fieldmodule = mesh.getFieldmodule()
+    fieldmodule.beginChange()
+    createElement = mesh.createElement
+    addElements = [ meshGroup.addElement for meshGroup in meshGroups ]
+    for e in range(elementsCount):
+        element = createElement(elementIdentifiers[e], elementtemplate)
+        element.setNodesByIdentifier(eft, elementsNodeIdentifiers[e])
+        if elementsScaleFactors is not None:
+            element.setScaleFactors(eft, elementsScaleFactors[e])
+        for addElement in addElements:
+            addElement(element)
+    fieldmodule.endChange()
+    return elementsCount
+
+def getNodesParameters(field, nodeset, valueLabels = None):
+    '''
+    Get all parameters of field at nodes in nodeset, all within a single begin/end change.
+    Versions of each value label are read from 1 until not found.
+    :param field: Zinc finite element field to get parameters of.
+    :param nodeset: Zinc nodeset or nodeset group to get parameters at.
+    :param valueLabels: List of node value labels to get, or None for value and all
+    derivatives up to D3_DS1DS2DS3.
+    :return: List of node identifiers, dict mapping tuple(valueLabel, version) to list of
+    parameters for each node, each a list of component values, or None if not defined at node.
+    Dict only contains value labels and versions found at some node.
+    '''
+    if valueLabels is None:
+        valueLabels = [ Node.VALUE_LABEL_VALUE, Node.VALUE_LABEL_D_DS1, Node.VALUE_LABEL_D_DS2, Node.VALUE_LABEL_D2_DS1DS2,
+            Node.VALUE_LABEL_D_DS3, Node.VALUE_LABEL_D2_DS1DS3, Node.VALUE_LABEL_D2_DS2DS3, Node.VALUE_LABEL_D3_DS1DS2DS3 ]
+    field = field.castFiniteElement()
+    componentsCount = field.getNumberOfComponents()
+    fieldmodule = field.getFieldmodule()
+    fieldmodule.beginChange()
+    cache = fieldmodule.createFieldcache()
+    setNode = cache.setNode
+    getNodeParameters = field.getNodeParameters
+    nodeIdentifiers = []
+    valueLabelParameters = {}
+    nodeiterator = nodeset.createNodeiterator()
+    node = nodeiterator.next()
+    while node.isValid():
+        n = len(nodeIdentifiers)
+        nodeIdentifiers.append(node.getIdentifier())
+        setNode(node)
+        for valueLabel in valueLabels:
+            version = 1
+            while True:
+                result, parameters = getNodeParameters(cache, -1, valueLabel, version, componentsCount)
+                if result != ZINC_OK:
+                    break
+                key = (valueLabel, version)
+                parametersList = valueLabelParameters.get(key)
+                if parametersList is None:
+                    parametersList = valueLabelParameters[key] = [ None ]*n
+                parametersList.append(parameters if (componentsCount > 1) else [ parameters ])
+                version += 1
+        # pad lists for value labels and versions not found at node
+        for parametersList in valueLabelParameters.values():
+            if len(parametersList) == n:
+                parametersList.append(None)
+        node = nodeiterator.next()
+    fieldmodule.endChange()
+    return nodeIdentifiers, valueLabelParameters
+
 def interpolateNodesCubicHermite(cache, coordinates, xi, normal_scale, \
         node1, derivative1, scale1, cross_derivative1, cross_scale1, \
         node2, derivative2, scale2, cross_derivative2, cross_scale2):
@@ -94,33 +268,73 @@ def interpolateNodesCubicHermite(cache, coordinates, xi, normal_scale, \
     :param cross_scale1, cross_scale2: Real value scaling cross_derivatives, to reverse if needed.
     :return: x, dx_ds, dx_ds_cross, dx_ds_normal
     """
-    cache.setNode(node1)
-    result, v1 = coordinates.getNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, 3 )
-    result, d1 = coordinates.getNodeParameters(cache, -1, derivative1, 1, 3 )
-    result, d1c = coordinates.getNodeParameters(cache, -1, cross_derivative1, 1, 3 )
-    d1 = [ scale1*d for d in d1 ]
-    d1c = [ cross_scale1*d for d in d1c ]
-    cache.setNode(node2)
-    result, v2 = coordinates.getNodeParameters(cache, -1, Node.VALUE_LABEL_VALUE, 1, 3 )
-    result, d2 = coordinates.getNodeParameters(cache, -1, derivative2, 1, 3 )
-    result, d2c = coordinates.getNodeParameters(cache, -1, cross_derivative2, 1, 3 )
-    d2 = [ scale2*d for d in d2 ]
-    d2c = [ cross_scale2*d for d in d2c ]
-
-    arcLength = computeCubicHermiteArcLength(v1, d1, v2, d2, True)
-    mag = arcLength/vector.magnitude(d1)
-    d1 = [ mag*d for d in d1 ]
-    mag = arcLength/vector.magnitude(d2)
-    d2 = [ mag*d for d in d2 ]
-
-    xr = 1.0 - xi
-    x = list(interpolateCubicHermite(v1, d1, v2, d2, xi))
-    dx_ds = interpolateCubicHermiteDerivative(v1, d1, v2, d2, xi)
-    scale = min(xi, xr)
-    dx_ds = [ scale*d for d in dx_ds ]
-    dx_ds_cross = [ (xr*d1c[c] + xi*d2c[c]) for c in range(3) ]
-
-    radialVector = vector.normalise(vector.crossproduct3(dx_ds_cross, dx_ds))
-    dx_ds_normal = [ normal_scale*d for d in radialVector ]
-
-    return x, dx_ds, dx_ds_cross, dx_ds_normal
+    xList, dx_dsList, dx_ds_crossList, dx_ds_normalList = interpolateNodesCubicHermiteList(cache, coordinates, [ ( xi, normal_scale, \
+        node1, derivative1, scale1, cross_derivative1, cross_scale1, \
+        node2, derivative2, scale2, cross_derivative2, cross_scale2) ])
+    return xList[0], dx_dsList[0], dx_ds_crossList[0], dx_ds_normalList[0]
+
+def interpolateNodesCubicHermiteList(cache, coordinates, interpolations):
+    """
+    Batch version of interpolateNodesCubicHermite. Node parameters are read once for each
+    node and value label used, and arc lengths are computed together.
+    :param cache: Field cache to evaluate in.
+    :param coordinates: Coordinates field.
+    :param interpolations: List of tuple(xi, normal_scale,
+        node1, derivative1, scale1, cross_derivative1, cross_scale1,
+        node2, derivative2, scale2, cross_derivative2, cross_scale2)
+    with arguments as for interpolateNodesCubicHermite.
+    :return: list of x, list of dx_ds, list of dx_ds_cross, list of dx_ds_normal
+    """
+    # map from (node identifier, value label) to parameters
+    nodeParameters = {}
+    def getParameters(node, valueLabel, scale):
+        key = (node.getIdentifier(), valueLabel)
+        parameters = nodeParameters.get(key)
+        if parameters is None:
+            cache.setNode(node)
+            result, parameters = coordinates.getNodeParameters(cache, -1, valueLabel, 1, 3 )
+            nodeParameters[key] = parameters
+        return [ scale*d for d in parameters ]
+
+    v1List = []
+    d1List = []
+    d1cList = []
+    v2List = []
+    d2List = []
+    d2cList = []
+    for xi, normal_scale, node1, derivative1, scale1, cross_derivative1, cross_scale1, \
+            node2, derivative2, scale2, cross_derivative2, cross_scale2 in interpolations:
+        v1List.append(getParameters(node1, Node.VALUE_LABEL_VALUE, 1.0))
+        d1List.append(getParameters(node1, derivative1, scale1))
+        d1cList.append(getParameters(node1, cross_derivative1, cross_scale1))
+        v2List.append(getParameters(node2, Node.VALUE_LABEL_VALUE, 1.0))
+        d2List.append(getParameters(node2, derivative2, scale2))
+        d2cList.append(getParameters(node2, cross_derivative2, cross_scale2))
+
+    arcLengths = computeCubicHermiteArcLengthList(v1List, d1List, v2List, d2List, True)
+    magnitudes1 = vector.magnitudeList(d1List)
+    magnitudes2 = vector.magnitudeList(d2List)
+
+    xList = []
+    dx_dsList = []
+    dx_ds_crossList = []
+    for i in range(len(interpolations)):
+        xi = interpolations[i][0]
+        v1, v2, d1c, d2c = v1List[i], v2List[i], d1cList[i], d2cList[i]
+        mag = arcLengths[i]/magnitudes1[i]
+        d1 = [ mag*d for d in d1List[i] ]
+        mag = arcLengths[i]/magnitudes2[i]
+        d2 = [ mag*d for d in d2List[i] ]
+
+        xr = 1.0 - xi
+        xList.append(list(interpolateCubicHermite(v1, d1, v2, d2, xi)))
+        dx_ds = interpolateCubicHermiteDerivative(v1, d1, v2, d2, xi)
+        scale = min(xi, xr)
+        dx_dsList.append([ scale*d for d in dx_ds ])
+        dx_ds_crossList.append([ (xr*d1c[c] + xi*d2c[c]) for c in range(3) ])
+
+    # normalise each vector as for a single interpolation so results are identical
+    radialVectors = [ vector.normalise(v) for v in vector.crossproduct3List(dx_ds_crossList, dx_dsList) ]
+    dx_ds_normalList = [ [ interpolation[1]*d for d in radialVector ] for interpolation, radialVector in zip(interpolations, radialVectors) ]
+
+    return xList, dx_dsList, dx_ds_crossList, dx_ds_normalList
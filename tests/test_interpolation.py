@@ -0,0 +1,25 @@
+import unittest
+
+from scaffoldmaker.utils.interpolation import computeCubicHermiteArcLengthList, solveCubicHermiteArcLength
+
+
+class InterpolationTestCase(unittest.TestCase):
+
+    def test_solve_cubic_hermite_arc_length_near_zero_speed(self):
+        """
+        Curve whose speed is near zero inside the element, on which the solver previously
+        cycled between two arc lengths until it ran out of iterations.
+        """
+        v1 = [ -0.82680, 0.34004, -0.12522 ]
+        d1 = [ -0.05356, 0.88881, -0.28965 ]
+        v2 = [ -0.71967, -0.37893, 0.32105 ]
+        d2 = [ -0.31986, 0.84516, 0.21195 ]
+        arcLength, iters = solveCubicHermiteArcLength(v1, d1, v2, d2, True)
+        self.assertLess(iters, 10)
+        self.assertAlmostEqual(arcLength, 1.0878172, delta = 1.0E-6)
+        arcLengths = computeCubicHermiteArcLengthList([ v1 ], [ d1 ], [ v2 ], [ d2 ], True)
+        self.assertEqual(arcLengths, [ arcLength ])
+
+
+if __name__ == "__main__":
+    unittest.main()